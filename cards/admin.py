@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Card, CardGroup
+from .models import ArchivedCard, Card, CardGroup, CardStats, GroupStats, ImportJob
 
 admin.site.site_header = 'FlashCard Admin'
 admin.site.site_title = 'FlashCard Admin Area'
@@ -37,3 +37,33 @@ class CardAdmin(admin.ModelAdmin):
         if not change:  # If creating a new object
             obj.user = request.user
         super().save_model(request, obj, form, change)
+
+@admin.register(CardStats)
+class CardStatsAdmin(admin.ModelAdmin):
+    list_display = ('card', 'flips', 'correct', 'incorrect', 'difficulty', 'last_reviewed_at')
+    list_select_related = ('card',)
+    ordering = ('-difficulty',)
+    readonly_fields = ('card', 'flips', 'correct', 'incorrect', 'difficulty', 'last_reviewed_at', 'updated_at')
+
+@admin.register(GroupStats)
+class GroupStatsAdmin(admin.ModelAdmin):
+    list_display = ('group', 'reviewed_cards', 'flips', 'correct', 'incorrect', 'difficulty', 'last_reviewed_at')
+    list_select_related = ('group',)
+    readonly_fields = ('group', 'reviewed_cards', 'flips', 'correct', 'incorrect', 'difficulty', 'last_reviewed_at', 'updated_at')
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'group', 'status', 'processed_rows', 'created_cards', 'failed_rows', 'rows_per_second', 'created_at')
+    list_filter = ('status', 'created_at')
+    list_select_related = ('group',)
+    readonly_fields = (
+        'status', 'worker', 'processed_rows', 'created_cards', 'skipped_rows', 'failed_rows',
+        'errors', 'rows_per_second', 'message', 'created_at', 'started_at', 'finished_at', 'updated_at',
+    )
+
+@admin.register(ArchivedCard)
+class ArchivedCardAdmin(admin.ModelAdmin):
+    list_display = ('uuid', 'group', 'user', 'archived_at')
+    list_filter = ('archived_at', 'group')
+    list_select_related = ('group', 'user')
+    readonly_fields = ('uuid', 'group', 'user', 'data', 'archived_at')
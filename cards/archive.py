@@ -0,0 +1,188 @@
+"""
+Cold storage for archived cards.
+
+``archive_cards`` moves cards that have been archived for longer than
+``CARDS_ARCHIVE_AFTER_DAYS`` into ``ArchivedCard``: one row per card holding
+its uuid, group and user plus the remaining fields and its ``CardStats`` as
+zlib-compressed JSON. The card table and its indexes then only hold cards
+that are still in use.
+
+Cards come back transparently: ``CardViewSet`` restores a cold card when it
+is requested by uuid, so reading it, un-archiving it with a PATCH or
+deleting it works as before. A restored card keeps its uuid, created_at and
+stats; its updated_at is the time of the restore, which keeps it in the card
+table for another full period. Raw review events of archived cards are
+dropped, so only cards whose events have all been rolled up are archived.
+Events that arrive for a card after it went cold are dropped when the
+review buffer is flushed (see cards.reviews).
+"""
+
+import json
+import uuid
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ArchivedCard, Card, CardStats, ReviewEvent, ReviewRollup
+from .signals import invalidate_card_caches
+
+STATUS = Card.STATUS_CHOICES
+
+STATS_FIELDS = ('flips', 'correct', 'incorrect', 'difficulty', 'last_reviewed_at')
+
+
+def pack(card, stats=None):
+    data = {
+        'name': card.name,
+        'name_key': card.name_key,
+        'description': card.description,
+        'image': card.image.name or '',
+        'status': card.status,
+        'created_at': card.created_at.isoformat(),
+        'updated_at': card.updated_at.isoformat(),
+    }
+    if stats is not None:
+        data['stats'] = {field: getattr(stats, field) for field in STATS_FIELDS}
+        if stats.last_reviewed_at is not None:
+            data['stats']['last_reviewed_at'] = stats.last_reviewed_at.isoformat()
+    payload = json.dumps(data, separators=(',', ':'))
+    return ArchivedCard(uuid=card.uuid, group_id=card.group_id, user_id=card.user_id, data=zlib.compress(payload.encode()))
+
+
+def unpack(archived):
+    """
+    Returns:
+        ``(card, stats)``; ``stats`` is None if the card had none
+    """
+    data = json.loads(zlib.decompress(bytes(archived.data)))
+    card = Card(
+        uuid=archived.uuid,
+        group_id=archived.group_id,
+        user_id=archived.user_id,
+        name=data['name'],
+        name_key=data['name_key'],
+        description=data['description'],
+        image=data['image'],
+        status=data['status'],
+        created_at=parse_datetime(data['created_at']),
+    )
+    stats = None
+    if 'stats' in data:
+        stats = CardStats(card_id=archived.uuid, **data['stats'])
+        if stats.last_reviewed_at is not None:
+            stats.last_reviewed_at = parse_datetime(stats.last_reviewed_at)
+    return card, stats
+
+
+def archivable_cards(older_than=None, group_id=None):
+    """Archived cards untouched for ``older_than`` whose review events are all rolled up"""
+    if older_than is None:
+        older_than = timedelta(days=getattr(settings, 'CARDS_ARCHIVE_AFTER_DAYS', 90))
+    watermark = ReviewRollup.objects.values_list('last_event_id', flat=True).first() or 0
+    queryset = (
+        Card.objects.filter(status=STATUS.ARCHIVED, updated_at__lt=timezone.now() - older_than)
+        .exclude(uuid__in=ReviewEvent.objects.filter(id__gt=watermark).values('card_id'))
+    )
+    if group_id is not None:
+        queryset = queryset.filter(group_id=group_id)
+    return queryset
+
+
+def archive_batch(queryset, batch_size=1000):
+    """
+    Move up to ``batch_size`` cards from ``queryset`` to cold storage.
+
+    Returns:
+        ``(cards_moved, compressed_bytes)``
+    """
+    with transaction.atomic():
+        cards = list(queryset.order_by().select_for_update(skip_locked=True)[:batch_size])
+        if not cards:
+            return 0, 0
+        uuids = [card.uuid for card in cards]
+        stats = CardStats.objects.in_bulk(uuids)
+        archived = [pack(card, stats.get(card.uuid)) for card in cards]
+        ArchivedCard.objects.bulk_create(archived)
+        ReviewEvent.objects.filter(card_id__in=uuids).delete()
+        CardStats.objects.filter(card_id__in=uuids).delete()
+        # A plain delete() would load the cards and send post_delete for each,
+        # invalidating the caches once per card; their dependents are gone, so
+        # drop the rows with one statement and invalidate once below
+        Card.objects.filter(uuid__in=uuids)._raw_delete(router.db_for_write(Card))
+
+    invalidate_card_caches(Card, group_ids={card.group_id for card in cards})
+    return len(archived), sum(len(card.data) for card in archived)
+
+
+def archive(older_than=None, group_id=None, batch_size=1000, progress=None):
+    """Move every archivable card to cold storage, calling ``progress(moved)`` after each batch"""
+    moved = compressed = 0
+    queryset = archivable_cards(older_than, group_id)
+    while True:
+        count, size = archive_batch(queryset, batch_size)
+        if not count:
+            return moved, compressed
+        moved += count
+        compressed += size
+        if progress is not None:
+            progress(moved)
+
+
+def restore(uuids):
+    """
+    Move cards back from cold storage into the card table.
+
+    Returns:
+        Set of uuids that were restored; unknown or malformed uuids are ignored
+    """
+    valid = []
+    for value in uuids:
+        try:
+            valid.append(uuid.UUID(str(value)))
+        except ValueError:
+            continue
+    if not valid:
+        return set()
+
+    with transaction.atomic():
+        archived = list(ArchivedCard.objects.select_for_update().filter(uuid__in=valid))
+        if not archived:
+            return set()
+        cards, stats = [], []
+        for item in archived:
+            card, card_stats = unpack(item)
+            cards.append(card)
+            if card_stats is not None:
+                stats.append(card_stats)
+
+        created_at = {card.uuid: card.created_at for card in cards}
+        # bulk_create skips Card.save() and signals, name_key is in the payload
+        Card.objects.bulk_create(cards)
+        # ...but it does stamp created_at, put the original back
+        for card in cards:
+            card.created_at = created_at[card.uuid]
+        Card.objects.bulk_update(cards, ['created_at'])
+        CardStats.objects.bulk_create(stats)
+        ArchivedCard.objects.filter(uuid__in=created_at).delete()
+
+    invalidate_card_caches(Card, group_ids={card.group_id for card in cards})
+    return set(created_at)
+
+
+def restore_all(group_id=None, batch_size=1000, progress=None):
+    """Move every cold card (of one group) back, calling ``progress(restored)`` after each batch"""
+    queryset = ArchivedCard.objects.order_by('uuid')
+    if group_id is not None:
+        queryset = queryset.filter(group_id=group_id)
+    total = 0
+    while True:
+        uuids = list(queryset.values_list('uuid', flat=True)[:batch_size])
+        if not uuids:
+            return total
+        total += len(restore(uuids))
+        if progress is not None:
+            progress(total)
@@ -0,0 +1,148 @@
+"""
+Near-duplicate detection for card names.
+
+Names are first normalized (case, umlaut spellings, leading/trailing
+articles, punctuation) into ``Card.name_key``, which is indexed and used for
+the cheap pre-insert check. Fuzzier matches are found in bulk with MinHash
+signatures over character trigrams and locality-sensitive hashing: cards
+only get compared when they share a signature band, so a pass over a group
+is roughly linear in the number of cards.
+"""
+
+import random
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+
+ARTICLES = {
+    'der', 'die', 'das', 'den', 'dem', 'des',
+    'ein', 'eine', 'einen', 'einem', 'einer', 'eines',
+    'the', 'a', 'an',
+}
+UMLAUTS = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss'})
+WORD_RE = re.compile(r'\w+')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_name(name):
+    """Reduce a card name to the key used for duplicate comparisons"""
+    # Compose first so decomposed input (a + U+0308) still hits the umlaut table
+    name = unicodedata.normalize('NFC', name or '').casefold().translate(UMLAUTS)
+    name = ''.join(
+        ch for ch in unicodedata.normalize('NFKD', name)
+        if not unicodedata.combining(ch)
+    )
+    words = WORD_RE.findall(name)
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    if len(words) > 1 and words[-1] in ARTICLES:
+        words = words[:-1]
+    return ' '.join(words)
+
+
+def trigrams(key):
+    """Character trigrams of a normalized key, padded so short words still match"""
+    padded = f'##{key}#'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash signatures with a fixed seed so runs are reproducible"""
+
+    def __init__(self, num_perm=32, bands=8, seed=1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingles):
+        hashes = [zlib.crc32(s.encode('utf-8')) for s in shingles] or [0]
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _MAX_HASH
+            for a, b in self._perms
+        )
+
+    def band_keys(self, signature):
+        rows = self.rows
+        return [
+            (band, signature[band * rows:(band + 1) * rows])
+            for band in range(self.bands)
+        ]
+
+
+def find_duplicate_clusters(cards, threshold=0.8, hasher=None):
+    """
+    Group near-duplicate cards.
+
+    Args:
+        cards: Iterable of (uuid, name) pairs, typically one group's cards
+        threshold: Minimum trigram Jaccard similarity to call two names duplicates
+        hasher: MinHasher to use, defaults to a 32-permutation / 8-band one
+
+    Returns:
+        List of clusters, each a list of (uuid, name) with at least two entries
+    """
+    hasher = hasher or MinHasher()
+    items = []
+    shingle_sets = []
+    buckets = defaultdict(list)
+    exact = defaultdict(list)
+
+    for uuid, name in cards:
+        key = normalize_name(name)
+        index = len(items)
+        items.append((uuid, name))
+        exact[key].append(index)
+        shingles = trigrams(key)
+        shingle_sets.append(shingles)
+        for band_key in hasher.band_keys(hasher.signature(shingles)):
+            buckets[band_key].append(index)
+
+    parent = list(range(len(items)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[root_j] = root_i
+
+    for indexes in exact.values():
+        for other in indexes[1:]:
+            union(indexes[0], other)
+
+    compared = set()
+    for indexes in buckets.values():
+        if len(indexes) < 2:
+            continue
+        for pos, i in enumerate(indexes):
+            for j in indexes[pos + 1:]:
+                if (i, j) in compared or find(i) == find(j):
+                    continue
+                compared.add((i, j))
+                if jaccard(shingle_sets[i], shingle_sets[j]) >= threshold:
+                    union(i, j)
+
+    clusters = defaultdict(list)
+    for index, item in enumerate(items):
+        clusters[find(index)].append(item)
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
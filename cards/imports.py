@@ -0,0 +1,199 @@
+"""
+Background CSV imports.
+
+Jobs are queued as ``ImportJob`` rows and claimed by ``run_import_worker``
+processes with ``SELECT ... FOR UPDATE SKIP LOCKED``, so any number of
+workers can share the queue without an external broker. Rows are inserted
+in batches; each batch and the job's progress counters are committed
+together, which lets a job whose worker died be requeued and resumed from
+``processed_rows``. Every progress update is conditional on the job still
+belonging to the worker, so a worker that was only slow, not dead, stops as
+soon as it notices the job was requeued instead of importing rows twice.
+"""
+
+import csv
+import io
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .dedup import normalize_name
+from .models import Card, ImportJob
+from .signals import invalidate_card_caches
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUS = ImportJob.STATUS_CHOICES
+
+# Only the first few failing rows are kept on the job, failed_rows has the total
+MAX_STORED_ERRORS = 100
+
+
+class ImportFileError(Exception):
+    pass
+
+
+class JobLostError(Exception):
+    """The job was requeued and claimed by another worker"""
+
+
+def detect_columns(fieldnames):
+    """Find the name and description columns the same way scripts/csv_to_flashcards.py does"""
+    name_col = desc_col = None
+    for field in fieldnames:
+        field_lower = field.lower()
+        if 'german' in field_lower or 'word' in field_lower or field_lower == 'name':
+            name_col = field
+        elif 'english' in field_lower or 'translation' in field_lower:
+            desc_col = field
+    return name_col, desc_col
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def requeue_stale_jobs(timeout):
+    """Put running jobs whose worker stopped reporting progress back on the queue"""
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return (
+        ImportJob.objects.filter(status=JOB_STATUS.RUNNING, updated_at__lt=cutoff)
+        .update(status=JOB_STATUS.QUEUED, worker='', updated_at=timezone.now())
+    )
+
+
+def claim_job():
+    """Atomically take the oldest queued job, or return None if the queue is empty"""
+    with transaction.atomic():
+        job = (
+            ImportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=JOB_STATUS.QUEUED)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = JOB_STATUS.RUNNING
+        job.worker = worker_name()
+        if job.started_at is None:
+            job.started_at = timezone.now()
+        job.save(update_fields=['status', 'worker', 'started_at', 'updated_at'])
+    return job
+
+
+def process_job(job, batch_size=500):
+    """Import every row of the job's CSV that has not been processed yet"""
+    resumed_from = job.processed_rows
+    started = time.monotonic()
+
+    try:
+        with job.file.open('rb') as raw:
+            reader = csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+            name_col, desc_col = detect_columns(reader.fieldnames or [])
+            if not name_col or not desc_col:
+                raise ImportFileError('Could not identify name and description columns')
+
+            batch = []
+            for row_num, row in enumerate(reader, 1):
+                if row_num <= resumed_from:
+                    continue
+                batch.append((row_num, row))
+                if len(batch) >= batch_size:
+                    _import_batch(job, batch, name_col, desc_col, resumed_from, started)
+                    batch = []
+            if batch:
+                _import_batch(job, batch, name_col, desc_col, resumed_from, started)
+    except JobLostError:
+        logger.warning('Import job %s was requeued, stopping', job.pk)
+        return job
+    except Exception as e:
+        job.status = JOB_STATUS.FAILED
+        job.message = str(e)
+    else:
+        job.status = JOB_STATUS.DONE
+
+    job.finished_at = timezone.now()
+    if not _save_owned(job, ['status', 'message', 'finished_at']):
+        logger.warning('Import job %s was requeued before it finished', job.pk)
+    return job
+
+
+def _save_owned(job, fields):
+    """
+    Write ``fields`` only if this worker still owns the running job.
+
+    Returns:
+        False if the job was requeued (and maybe claimed by another worker)
+    """
+    job.updated_at = timezone.now()
+    values = {field: getattr(job, field) for field in [*fields, 'updated_at']}
+    return bool(
+        ImportJob.objects.filter(pk=job.pk, status=JOB_STATUS.RUNNING, worker=job.worker)
+        .update(**values)
+    )
+
+
+def _import_batch(job, batch, name_col, desc_col, resumed_from, started):
+    cards = []
+    seen = set()
+    for row_num, row in batch:
+        name = (row.get(name_col) or '').strip()
+        description = (row.get(desc_col) or '').strip()
+        if not name or not description:
+            _record_error(job, row_num, 'missing name or description')
+            continue
+        if len(name) > Card._meta.get_field('name').max_length:
+            _record_error(job, row_num, 'name is too long')
+            continue
+        key = normalize_name(name)[:255]
+        if job.skip_duplicates and key in seen:
+            job.skipped_rows += 1
+            continue
+        seen.add(key)
+        cards.append(Card(
+            name=name,
+            name_key=key,
+            description=description,
+            group_id=job.group_id,
+            user_id=job.user_id,
+            status=job.card_status,
+        ))
+
+    with transaction.atomic():
+        if job.skip_duplicates and cards:
+            existing = set(
+                Card.objects.filter(group_id=job.group_id, name_key__in=seen)
+                .values_list('name_key', flat=True)
+            )
+            kept = [card for card in cards if card.name_key not in existing]
+            job.skipped_rows += len(cards) - len(kept)
+            cards = kept
+
+        # bulk_create skips Card.save() and signals, name_key is set above
+        Card.objects.bulk_create(cards)
+        job.created_cards += len(cards)
+        job.processed_rows = batch[-1][0]
+        elapsed = time.monotonic() - started
+        if elapsed > 0:
+            job.rows_per_second = round((job.processed_rows - resumed_from) / elapsed, 1)
+        owned = _save_owned(job, [
+            'processed_rows', 'created_cards', 'skipped_rows', 'failed_rows',
+            'errors', 'rows_per_second',
+        ])
+        if not owned:
+            # Roll the batch back, the new owner imports it
+            raise JobLostError
+
+    if cards:
+        invalidate_card_caches(Card, group_ids=[job.group_id])
+
+
+def _record_error(job, row_num, error):
+    job.failed_rows += 1
+    if len(job.errors) < MAX_STORED_ERRORS:
+        job.errors.append({'row': row_num, 'error': error})
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cards import archive
+from cards.models import ArchivedCard, CardGroup
+
+
+class Command(BaseCommand):
+    help = 'Move long-archived cards out of the card table into compressed cold storage (see cards/archive.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=None,
+                            help='Days since a card was archived '
+                                 f'(default: CARDS_ARCHIVE_AFTER_DAYS, {settings.CARDS_ARCHIVE_AFTER_DAYS})')
+        parser.add_argument('--group', help='Only this group (name or id)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Cards moved per transaction (default: 1000)')
+        parser.add_argument('--restore', action='store_true',
+                            help='Move cold cards back into the card table instead')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the cards that would be moved')
+
+    def handle(self, *args, **options):
+        group_id = self.get_group_id(options['group'])
+
+        if options['restore']:
+            if options['dry_run']:
+                queryset = ArchivedCard.objects.all()
+                if group_id is not None:
+                    queryset = queryset.filter(group_id=group_id)
+                self.stdout.write(f'{queryset.count()} cards would be restored')
+                return
+            restored = archive.restore_all(group_id, options['batch_size'], self.progress)
+            self.stdout.write(self.style.SUCCESS(f'Restored {restored} cards'))
+            return
+
+        older_than = None
+        if options['older_than'] is not None:
+            older_than = timedelta(days=options['older_than'])
+        if options['dry_run']:
+            count = archive.archivable_cards(older_than, group_id).count()
+            self.stdout.write(f'{count} cards would be moved to cold storage')
+            return
+
+        moved, size = archive.archive(older_than, group_id, options['batch_size'], self.progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} cards to cold storage ({size / 1024:.1f} KB compressed)'
+        ))
+
+    def progress(self, total):
+        self.stdout.write(f'{total} cards', ending='\r')
+
+    def get_group_id(self, group):
+        if group is None:
+            return None
+        lookup = {'id': group} if group.isdecimal() else {'name__iexact': group}
+        try:
+            return CardGroup.objects.get(**lookup).id
+        except CardGroup.DoesNotExist:
+            raise CommandError(f'Group "{group}" does not exist')
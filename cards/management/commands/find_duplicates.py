@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cards.dedup import MinHasher, find_duplicate_clusters, normalize_name
+from cards.models import Card, CardGroup
+
+
+class Command(BaseCommand):
+    help = 'Report near-duplicate cards within each group (MinHash/trigram based)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', help='Only check this group (name or id)')
+        parser.add_argument('--threshold', type=float, default=0.8,
+                            help='Minimum trigram similarity to report (default: 0.8)')
+        parser.add_argument('--num-perm', type=int, default=32,
+                            help='MinHash permutations per signature (default: 32)')
+        parser.add_argument('--bands', type=int, default=8,
+                            help='LSH bands; more bands find looser matches (default: 8)')
+        parser.add_argument('--update-keys', action='store_true',
+                            help='Backfill Card.name_key for existing rows before checking')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows fetched/updated per batch (default: 2000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        try:
+            hasher = MinHasher(num_perm=options['num_perm'], bands=options['bands'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        groups = self.get_groups(options['group'])
+
+        if options['update_keys']:
+            updated = self.update_keys(groups, batch_size)
+            self.stdout.write(f'Updated name_key on {updated} cards')
+
+        total_clusters = 0
+        for group in groups:
+            cards = (
+                Card.objects.filter(group=group)
+                .order_by()
+                .values_list('uuid', 'name')
+                .iterator(chunk_size=batch_size)
+            )
+            clusters = find_duplicate_clusters(cards, options['threshold'], hasher)
+            total_clusters += len(clusters)
+            for cluster in clusters:
+                label = group.name if group else '(no group)'
+                names = ', '.join(f'{name} [{uuid}]' for uuid, name in cluster)
+                self.stdout.write(f'{label}: {names}')
+
+        self.stdout.write(self.style.SUCCESS(f'Found {total_clusters} duplicate clusters'))
+
+    def get_groups(self, group):
+        if group is None:
+            return [*CardGroup.objects.order_by('id'), None]
+        lookup = {'id': group} if group.isdecimal() else {'name__iexact': group}
+        try:
+            return [CardGroup.objects.get(**lookup)]
+        except CardGroup.DoesNotExist:
+            raise CommandError(f'Group "{group}" does not exist')
+
+    def update_keys(self, groups, batch_size):
+        updated = 0
+        pending = []
+        for group in groups:
+            cards = (
+                Card.objects.filter(group=group)
+                .order_by()
+                .only('uuid', 'name', 'name_key')
+                .iterator(chunk_size=batch_size)
+            )
+            for card in cards:
+                key = normalize_name(card.name)[:255]
+                if card.name_key != key:
+                    card.name_key = key
+                    pending.append(card)
+                if len(pending) >= batch_size:
+                    Card.objects.bulk_update(pending, ['name_key'])
+                    updated += len(pending)
+                    pending = []
+        if pending:
+            Card.objects.bulk_update(pending, ['name_key'])
+            updated += len(pending)
+        return updated
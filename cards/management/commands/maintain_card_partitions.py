@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from cards import partitioning
+
+
+class Command(BaseCommand):
+    help = 'Vacuum, analyze and optionally reindex the card table one partition at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partition', action='append', default=[],
+                            help='Only maintain this partition (repeatable)')
+        parser.add_argument('--reindex', action='store_true',
+                            help='Also rebuild each partition\'s indexes with REINDEX CONCURRENTLY')
+        parser.add_argument('--list', action='store_true',
+                            help='Only list partitions with their estimated rows and size')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning needs PostgreSQL')
+
+        with connection.cursor() as cursor:
+            if not partitioning.is_partitioned(cursor):
+                raise CommandError(f'{partitioning.TABLE} is not partitioned, see partition_cards')
+            partitions = partitioning.list_partitions(cursor)
+
+        if options['list']:
+            for name, bound, rows, size in partitions:
+                self.stdout.write(f'{name:<24} {rows:>12} rows {size / 2**20:>10.1f} MB  {bound}')
+            return
+
+        names = [name for name, *_ in partitions]
+        selected = options['partition'] or names
+        unknown = set(selected) - set(names)
+        if unknown:
+            raise CommandError(f'Unknown partitions: {", ".join(sorted(unknown))}')
+
+        # Autovacuum never analyzes a partitioned parent, so when every
+        # partition is maintained the parent is analyzed once at the end,
+        # which also analyzes the partitions
+        analyze_parent = not options['partition']
+        with connection.cursor() as cursor:
+            for name in selected:
+                started = time.monotonic()
+                cursor.execute(f'VACUUM {name}' if analyze_parent else f'VACUUM (ANALYZE) {name}')
+                if options['reindex']:
+                    cursor.execute(f'REINDEX TABLE CONCURRENTLY {name}')
+                self.stdout.write(f'{name}: {time.monotonic() - started:.1f}s')
+            if analyze_parent:
+                cursor.execute(f'ANALYZE {partitioning.TABLE}')
+
+        self.stdout.write(self.style.SUCCESS(f'Maintained {len(selected)} partition(s)'))
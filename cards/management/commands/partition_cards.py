@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from cards import partitioning
+
+
+class Command(BaseCommand):
+    help = 'Convert the card table to a PostgreSQL partitioned table without downtime (see cards/partitioning.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('step', nargs='?', default='all', choices=['prepare', 'copy', 'swap', 'all'],
+                            help='Run one step, or all of them in order (default: all)')
+        parser.add_argument('--strategy', default='hash', choices=partitioning.STRATEGIES,
+                            help='hash: by group_id, status: one partition per status (default: hash)')
+        parser.add_argument('--partitions', type=int, default=16,
+                            help='Number of hash partitions (default: 16)')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Rows copied per transaction; card writes wait for a running batch (default: 10000)')
+        parser.add_argument('--skip-verify', action='store_true',
+                            help="Don't compare row counts before swapping, which scans both tables (before the lock is taken)")
+        parser.add_argument('--print-sql', action='store_true',
+                            help='Only print the DDL the prepare step would run')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning needs PostgreSQL')
+
+        step = options['step']
+        try:
+            if options['print_sql']:
+                with connection.cursor() as cursor:
+                    statements = partitioning.prepare_statements(
+                        cursor, options['strategy'], options['partitions'],
+                    )
+                self.stdout.write(';\n'.join(statement.strip() for statement in statements) + ';')
+                return
+
+            with connection.cursor() as cursor:
+                prepared = partitioning.table_exists(cursor, partitioning.NEW_TABLE)
+            if step == 'prepare' or (step == 'all' and not prepared):
+                partitioning.prepare(options['strategy'], options['partitions'])
+                self.stdout.write(f'Created {partitioning.NEW_TABLE} ({options["strategy"]})')
+
+            if step in ('copy', 'all'):
+                copied = partitioning.copy(
+                    batch_size=options['batch_size'],
+                    progress=lambda total: self.stdout.write(f'Copied {total} cards', ending='\r'),
+                )
+                self.stdout.write(f'Copied {copied} cards')
+
+            if step in ('swap', 'all'):
+                partitioning.swap(verify=not options['skip_verify'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'{partitioning.TABLE} is now partitioned. Drop {partitioning.OLD_TABLE} once you no longer need it.'
+                ))
+        except partitioning.PartitioningError as e:
+            raise CommandError(e)
@@ -0,0 +1,123 @@
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so nothing this command imported skews the numbers
+PROBE = r'''
+import importlib, json, os, sys, time
+
+def rss_kb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def load_urls():
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+
+steps = []
+def step(label, fn):
+    before, started = rss_kb(), time.perf_counter()
+    error = None
+    try:
+        fn()
+    except ImportError as e:
+        error = str(e)
+    steps.append({
+        'step': label,
+        'ms': round((time.perf_counter() - started) * 1000, 1),
+        'rss_kb': rss_kb(),
+        'delta_kb': rss_kb() - before,
+        'error': error,
+    })
+
+step('interpreter', lambda: None)
+step('wsgi application', lambda: importlib.import_module('flashcards.wsgi'))
+step('url conf and views', load_urls)
+for module in sys.argv[1:]:
+    step(module, lambda module=module: importlib.import_module(module))
+print(json.dumps(steps))
+'''
+
+# Imported lazily by the app; measured separately to show what they would add
+DEFAULT_MODULES = ['storages.backends.s3boto3', 'PIL.Image', 'msgpack']
+
+
+class Command(BaseCommand):
+    help = 'Report import time and resident memory of a cold app start, per phase and module'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20,
+                            help='Number of slowest imports to list (default: 20)')
+        parser.add_argument('--module', action='append', default=None,
+                            help='Extra module to measure after startup (repeatable)')
+        parser.add_argument('--json', action='store_true', help='Print the raw measurements as JSON')
+        parser.add_argument('--max-ms', type=float,
+                            help='Fail if loading the app and URL conf takes longer than this')
+        parser.add_argument('--max-rss-mb', type=float,
+                            help='Fail if resident memory after loading the URL conf exceeds this')
+
+    def handle(self, *args, **options):
+        modules = DEFAULT_MODULES + (options['module'] or [])
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE, *modules],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Startup probe failed:\n{result.stderr[-2000:]}')
+
+        steps = json.loads(result.stdout.strip().splitlines()[-1])
+        imports = self.parse_importtime(result.stderr)
+
+        if options['json']:
+            self.stdout.write(json.dumps({'steps': steps, 'imports': imports[:options['top']]}, indent=2))
+        else:
+            self.print_report(steps, imports[:options['top']])
+
+        startup = steps[1:3]
+        startup_ms = sum(step['ms'] for step in startup)
+        startup_mb = startup[-1]['rss_kb'] / 1024
+        if options['max_ms'] is not None and startup_ms > options['max_ms']:
+            raise CommandError(f'Startup took {startup_ms:.0f} ms, over the {options["max_ms"]:.0f} ms budget')
+        if options['max_rss_mb'] is not None and startup_mb > options['max_rss_mb']:
+            raise CommandError(f'Startup RSS is {startup_mb:.1f} MB, over the {options["max_rss_mb"]:.1f} MB budget')
+
+    def parse_importtime(self, stderr):
+        """(module, self ms, cumulative ms) for each import, slowest self time first"""
+        imports = []
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            imports.append({
+                'module': name.strip(),
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+            })
+        return sorted(imports, key=lambda row: row['self_ms'], reverse=True)
+
+    def print_report(self, steps, imports):
+        self.stdout.write('Startup phases')
+        self.stdout.write(f'  {"phase":<32} {"time":>10} {"RSS":>10} {"delta":>10}')
+        for step in steps:
+            line = (
+                f'  {step["step"]:<32} {step["ms"]:>7.1f} ms {step["rss_kb"] / 1024:>7.1f} MB '
+                f'{step["delta_kb"] / 1024:>+7.1f} MB'
+            )
+            if step['error']:
+                line += f'  (not installed: {step["error"]})'
+            self.stdout.write(line)
+
+        self.stdout.write('')
+        self.stdout.write('Slowest imports')
+        self.stdout.write(f'  {"self":>10} {"cumulative":>12}  module')
+        for row in imports:
+            self.stdout.write(f'  {row["self_ms"]:>7.1f} ms {row["cumulative_ms"]:>9.1f} ms  {row["module"]}')
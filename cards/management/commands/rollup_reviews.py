@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from cards.reviews import rollup
+
+
+class Command(BaseCommand):
+    help = 'Fold new review events into per-card and per-group difficulty stats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100000,
+                            help='Events aggregated per transaction (default: 100000)')
+
+    def handle(self, *args, **options):
+        events = rollup(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {events} review events'))
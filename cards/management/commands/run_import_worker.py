@@ -0,0 +1,68 @@
+import logging
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connections
+
+from cards.imports import claim_job, process_job, requeue_stale_jobs
+
+logger = logging.getLogger(__name__)
+
+
+def work(batch_size, poll_interval, stale_timeout, once):
+    """Claim and process jobs until interrupted (or the queue is empty with once=True)"""
+    # Connections inherited from the parent process must not be shared
+    connections.close_all()
+    while True:
+        close_old_connections()
+        try:
+            requeue_stale_jobs(stale_timeout)
+            job = claim_job()
+        except DatabaseError:
+            logger.exception('Could not claim an import job, retrying')
+            time.sleep(poll_interval)
+            continue
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        process_job(job, batch_size=batch_size)
+
+
+class Command(BaseCommand):
+    help = 'Process queued CSV import jobs (see /api/imports/)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Number of worker processes (default: 1)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows inserted per transaction (default: 500)')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait when the queue is empty (default: 2)')
+        parser.add_argument('--stale-timeout', type=int, default=600,
+                            help='Requeue running jobs without progress for this many seconds (default: 600)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling')
+
+    def handle(self, *args, **options):
+        worker_args = (
+            options['batch_size'], options['poll_interval'], options['stale_timeout'], options['once'],
+        )
+        processes = max(1, options['processes'])
+        self.stdout.write(f'Starting {processes} import worker(s)')
+
+        if processes == 1:
+            work(*worker_args)
+            return
+
+        workers = [multiprocessing.Process(target=work, args=worker_args) for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
@@ -0,0 +1,183 @@
+"""
+Weighted, interleaved study mixes across several groups.
+
+Each group's card ids are loaded once into an in-process pool, so building a
+mix is a few ``random.sample`` calls plus one ``uuid__in`` query instead of
+an ``ORDER BY random()`` over every group. Pools are invalidated the same way
+as the suggestion indexes: a per-group version in the cache bumped by the card
+signals, plus a TTL. Pools hold at most ``CARDS_MIX_MAX_POOL`` ids per group. A larger
+group is loaded as a window of consecutive uuids from a random starting point,
+wrapping around, so every card gets into some pool as they expire. Ids are packed 16 bytes apiece into a single ``bytes`` object, a
+list of ``UUID`` objects would take about seven times as much memory.
+"""
+
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Card
+
+VERSION_CACHE_KEY = 'cards:mix:version:{}'
+
+
+def version_key(group_id):
+    return VERSION_CACHE_KEY.format(group_id)
+
+
+def bump_version(group_ids):
+    """Invalidate the loaded id pools of ``group_ids`` in every process sharing the cache"""
+    for group_id in set(group_ids) - {None}:
+        try:
+            cache.incr(version_key(group_id))
+        except ValueError:
+            cache.set(version_key(group_id), 1, timeout=None)
+
+
+def parse_weights(value):
+    """
+    Parse ``1:70,2:30`` into ``{1: 70.0, 2: 30.0}``; a bare id gets weight 1.
+
+    Raises:
+        ValueError: if an id or weight is malformed or a weight is not a positive number
+    """
+    weights = {}
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        group_id, _, weight = part.partition(':')
+        weight = float(weight) if weight else 1.0
+        if not math.isfinite(weight) or weight <= 0:
+            raise ValueError(f'weight for group {group_id} must be a positive number')
+        weights[int(group_id)] = weight
+    return weights
+
+
+def interleave(counts, weights):
+    """
+    Order group ids by smooth weighted round-robin, so a 70/30 mix reads
+    A A B A A B A ... rather than all A's then all B's.
+    """
+    remaining = dict(counts)
+    current = {group_id: 0.0 for group_id in remaining}
+    order = []
+    while any(remaining.values()):
+        active = [group_id for group_id, left in remaining.items() if left]
+        total = sum(weights[group_id] for group_id in active)
+        for group_id in active:
+            current[group_id] += weights[group_id]
+        chosen = max(active, key=lambda group_id: current[group_id])
+        current[chosen] -= total
+        remaining[chosen] -= 1
+        order.append(chosen)
+    return order
+
+
+def allocate(count, weights, sizes):
+    """Split ``count`` slots across groups by weight, capped by pool sizes"""
+    counts = {group_id: 0 for group_id in weights}
+    available = {group_id: weight for group_id, weight in weights.items() if sizes[group_id]}
+    left = min(count, sum(sizes.values()))
+    while left and available:
+        total = sum(available.values())
+        shares = {group_id: left * weight / total for group_id, weight in available.items()}
+        # Largest remainder rounding so the shares add up exactly
+        floors = {group_id: int(share) for group_id, share in shares.items()}
+        extra = left - sum(floors.values())
+        for group_id in sorted(shares, key=lambda g: shares[g] - floors[g], reverse=True)[:extra]:
+            floors[group_id] += 1
+        for group_id, share in floors.items():
+            take = min(share, sizes[group_id] - counts[group_id])
+            counts[group_id] += take
+            left -= take
+            if counts[group_id] >= sizes[group_id]:
+                available.pop(group_id)
+    return counts
+
+
+class IdPool:
+    """A group's card uuids packed into one bytes object"""
+    __slots__ = ('data',)
+
+    def __init__(self, uuids=()):
+        self.data = b''.join(value.bytes for value in uuids)
+
+    def __len__(self):
+        return len(self.data) // 16
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError('pool index out of range')
+        return uuid.UUID(bytes=self.data[index * 16:(index + 1) * 16])
+
+    def sample(self, count):
+        return [self[index] for index in random.sample(range(len(self)), count)]
+
+
+class CardPools:
+    """LRU registry of per-group card id pools for the current process"""
+
+    def __init__(self, max_groups=None, max_pool=None, ttl=None):
+        self.max_groups = max_groups or getattr(settings, 'CARDS_MIX_MAX_GROUPS', 32)
+        self.max_pool = max_pool or getattr(settings, 'CARDS_MIX_MAX_POOL', 100000)
+        self.ttl = ttl or getattr(settings, 'CARDS_MIX_TTL', 300)
+        self._pools = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._pools.clear()
+
+    def invalidate(self, group_id):
+        with self._lock:
+            self._pools.pop(group_id, None)
+
+    def get(self, group_id, version=None):
+        """A group's pool, loading it if missing, expired or older than ``version``"""
+        if version is None:
+            version = cache.get(version_key(group_id), 0)
+        with self._lock:
+            entry = self._pools.get(group_id)
+            if entry is not None and entry[1] == version and time.monotonic() - entry[0] < self.ttl:
+                self._pools.move_to_end(group_id)
+                return entry[2]
+
+        pool = self.load(group_id)
+        with self._lock:
+            self._pools[group_id] = (time.monotonic(), version, pool)
+            self._pools.move_to_end(group_id)
+            while len(self._pools) > self.max_groups:
+                self._pools.popitem(last=False)
+        return pool
+
+    def load(self, group_id):
+        """Up to ``max_pool`` ids of a group, from a random point in uuid order"""
+        start = uuid.UUID(int=random.getrandbits(128))
+        cards = Card.objects.filter(group_id=group_id).order_by('uuid').values_list('uuid', flat=True)
+        ids = list(cards.filter(uuid__gte=start)[:self.max_pool].iterator(chunk_size=5000))
+        if len(ids) < self.max_pool:
+            ids += cards.filter(uuid__lt=start)[:self.max_pool - len(ids)].iterator(chunk_size=5000)
+        return IdPool(ids)
+
+    def sample(self, weights, count):
+        """
+        Pick card ids for a weighted mix.
+
+        Returns:
+            List of card uuids in interleaved study order
+        """
+        keys = {group_id: version_key(group_id) for group_id in weights}
+        versions = cache.get_many(keys.values())
+        pools = {group_id: self.get(group_id, versions.get(key, 0)) for group_id, key in keys.items()}
+        counts = allocate(count, weights, {g: len(pool) for g, pool in pools.items()})
+        picks = {g: pools[g].sample(n) for g, n in counts.items() if n}
+        return [picks[g].pop() for g in interleave({g: len(ids) for g, ids in picks.items()}, weights)]
+
+
+card_pools = CardPools()
@@ -1,8 +1,39 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
 import uuid
 from django.urls import reverse
 
+from .dedup import normalize_name
+
     
+class CardGroupQuerySet(models.QuerySet):
+    def by_name(self, name):
+        """Case-insensitive name lookup that can use the lower(name) index"""
+        # Lower both sides in SQL, Python's lower() disagrees with the database for some characters
+        return self.alias(name_lower=Lower('name')).filter(name_lower=Lower(models.Value(name)))
+
+    def get_or_create_by_name(self, name):
+        """
+        Race-safe, case-insensitive get-or-create.
+
+        Returns:
+            (group, created) like QuerySet.get_or_create
+        """
+        group = self.by_name(name).first()
+        if group is not None:
+            return group, False
+        try:
+            with transaction.atomic():
+                return self.create(name=name), True
+        except IntegrityError:
+            # Another request created it between our lookup and insert
+            group = self.by_name(name).first()
+            if group is None:
+                raise
+            return group, False
+
+
 class CardGroup(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255, unique=True, null=False, blank=False)
@@ -10,11 +41,17 @@ class CardGroup(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CardGroupQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            # Also serves as the functional index behind CardGroupQuerySet.by_name
+            models.UniqueConstraint(Lower('name'), name='cardgroup_name_lower_uniq'),
+        ]
 
 class Card(models.Model):
     class STATUS_CHOICES(models.TextChoices):
@@ -22,6 +59,13 @@ class Card(models.Model):
         PUBLISHED = 'published', 'Published'
         ARCHIVED = 'archived', 'Archived'
 
+    # Once partition_cards has run (cards/partitioning.py) the database can only
+    # enforce uniqueness of uuid together with the partition key, and uuid
+    # alone cannot be the target of a foreign key. Uniqueness then rests on
+    # uuids being random uuid4s generated here: never set one from outside
+    # (cold storage restores reuse the uuid of a card that has been deleted).
+    # Foreign keys to Card must use db_constraint=False; Django still applies
+    # on_delete.
     uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
     group = models.ForeignKey('CardGroup', on_delete=models.CASCADE, null=True, blank=True)
@@ -31,9 +75,150 @@ class Card(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey('auth.User', on_delete=models.CASCADE, null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES.choices, default=STATUS_CHOICES.DRAFT)
+    # Normalized name used for duplicate detection, see cards.dedup.normalize_name
+    name_key = models.CharField(max_length=255, default='', blank=True, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['group', 'name_key'], name='card_group_name_key_idx'),
+            models.Index(fields=['group', 'status'], name='card_group_status_idx'),
+            models.Index(fields=['updated_at'], name='card_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        card = super().from_db(db, field_names, values)
+        # Lets the cache signals invalidate the group a card is moved out of
+        card._loaded_group_id = card.__dict__.get('group_id')
+        return card
+
+    def save(self, *args, **kwargs):
+        self.name_key = normalize_name(self.name)[:255]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'name_key'}
+        super().save(*args, **kwargs)
+
+
+class ReviewEvent(models.Model):
+    """A single study interaction, written in batches by cards.reviews.ReviewEventBuffer"""
+    class EVENT_CHOICES(models.TextChoices):
+        FLIP = 'flip', 'Flip'
+        CORRECT = 'correct', 'Correct'
+        INCORRECT = 'incorrect', 'Incorrect'
+
+    # No database constraint, see Card.uuid
+    card = models.ForeignKey('Card', on_delete=models.CASCADE, related_name='review_events', db_constraint=False)
+    user = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True)
+    event = models.CharField(max_length=10, choices=EVENT_CHOICES.choices)
+    response_ms = models.PositiveIntegerField(null=True, blank=True)
+    occurred_at = models.DateTimeField(default=timezone.now)
+    # Set when the buffer writes the event; bounds what a rollup may fold in
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.event} {self.card_id}'
+
+
+class CardStats(models.Model):
+    """Per-card review counters, maintained by the rollup_reviews command"""
+    # No database constraint, see Card.uuid
+    card = models.OneToOneField('Card', on_delete=models.CASCADE, primary_key=True, related_name='stats', db_constraint=False)
+    flips = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    incorrect = models.PositiveIntegerField(default=0)
+    difficulty = models.FloatField(default=0.5)
+    last_reviewed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'card stats'
+        indexes = [
+            models.Index(fields=['-difficulty'], name='cardstats_difficulty_idx'),
+        ]
+
+    def __str__(self):
+        return f'Stats for {self.card_id}'
+
+
+class GroupStats(models.Model):
+    """Per-group review counters, recomputed from CardStats by the rollup_reviews command"""
+    group = models.OneToOneField('CardGroup', on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    reviewed_cards = models.PositiveIntegerField(default=0)
+    flips = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    incorrect = models.PositiveIntegerField(default=0)
+    difficulty = models.FloatField(default=0.5)
+    last_reviewed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'group stats'
+
+    def __str__(self):
+        return f'Stats for {self.group}'
+
+
+class ReviewRollup(models.Model):
+    """
+    Watermark of ReviewEvent ids already folded into the stats tables.
+    A single row, locked by each rollup batch so overlapping runs take turns.
+    """
+    last_event_id = models.BigIntegerField(default=0)
+    events = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class ArchivedCard(models.Model):
+    """An archived card moved out of the card table, see cards.archive"""
+    uuid = models.UUIDField(primary_key=True, editable=False)
+    group = models.ForeignKey('CardGroup', on_delete=models.CASCADE, null=True, blank=True, related_name='archived_cards')
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, null=True, blank=True)
+    # zlib-compressed JSON of the card's remaining fields and its CardStats
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Archived card {self.uuid}'
+
+
+class ImportJob(models.Model):
+    """A CSV upload processed in the background by the run_import_worker command"""
+    class STATUS_CHOICES(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    file = models.FileField(upload_to='imports/')
+    group = models.ForeignKey('CardGroup', on_delete=models.CASCADE, related_name='import_jobs')
+    user = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True)
+    card_status = models.CharField(max_length=10, choices=Card.STATUS_CHOICES.choices, default=Card.STATUS_CHOICES.PUBLISHED)
+    skip_duplicates = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES.choices, default=STATUS_CHOICES.QUEUED)
+    worker = models.CharField(max_length=255, blank=True)
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_cards = models.PositiveIntegerField(default=0)
+    skipped_rows = models.PositiveIntegerField(default=0)
+    failed_rows = models.PositiveIntegerField(default=0)
+    # First few failing rows as {"row": n, "error": "..."}; failed_rows has the full count
+    errors = models.JSONField(default=list, blank=True)
+    rows_per_second = models.FloatField(default=0)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='importjob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'Import {self.pk} into {self.group} ({self.status})'
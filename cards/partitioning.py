@@ -0,0 +1,294 @@
+"""
+Optional PostgreSQL declarative partitioning of the card table.
+
+``partition_cards`` rebuilds ``cards_card`` as a partitioned table while the
+site keeps running:
+
+1. ``prepare`` creates ``cards_card_partitioned`` with its partitions, the
+   indexes and foreign keys of ``cards_card``, and a trigger that mirrors
+   writes to rows that have already been copied.
+2. ``copy`` moves rows over in uuid order, one batch per transaction. The
+   watermark is kept in ``cards_card_copy_progress``, so an interrupted copy
+   resumes where it stopped.
+3. ``swap`` renames the tables under a short exclusive lock and keeps the old
+   table as ``cards_card_unpartitioned`` until it is dropped by hand.
+
+Partitions are either ``hash`` of ``group_id`` (queries for one group touch
+one partition) or a list by ``status``. Unique constraints on a partitioned
+table must include the partition key, so ``uuid`` is only unique together
+with it: ``(uuid, status)`` is the primary key of a status-partitioned
+table, while ``group_id`` is nullable and cannot be part of one, so a
+hash-partitioned table has no primary key and only ``UNIQUE (uuid,
+group_id)``, under which rows without a group never conflict. ``uuid`` stays
+unique because the app only ever generates random ones (see ``Card.uuid``).
+Foreign keys cannot point at a partitioned table by ``uuid`` alone, so the
+models declare them without database constraints and ``swap`` drops any
+left over from older schemas. Django applies ``on_delete`` itself, so
+deleting cards still cascades. Lookups by uuid alone probe the uuid index of
+every partition.
+"""
+
+import re
+
+from django.db import connection, transaction
+
+from .models import Card
+
+TABLE = Card._meta.db_table
+NEW_TABLE = f'{TABLE}_partitioned'
+OLD_TABLE = f'{TABLE}_unpartitioned'
+PROGRESS_TABLE = f'{TABLE}_copy_progress'
+# Name of both the trigger and its function
+MIRROR_TRIGGER = f'{TABLE}_mirror_copied'
+MAX_UUID = 'ffffffff-ffff-ffff-ffff-ffffffffffff'
+
+STRATEGIES = ('hash', 'status')
+
+INDEX_DEF = re.compile(r'^CREATE INDEX (\S+) ON (\S+) (USING .*)$')
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def _temp_name(name, suffix):
+    # Index names are global and limited to 63 characters
+    return f'{name[:59]}_{suffix}'
+
+
+def table_exists(cursor, table):
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [table])
+    return cursor.fetchone()[0]
+
+
+def is_partitioned(cursor, table=TABLE):
+    cursor.execute(
+        'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))',
+        [table],
+    )
+    return cursor.fetchone()[0]
+
+
+def list_partitions(cursor, table=TABLE):
+    """
+    Returns:
+        List of ``(name, bound, estimated_rows, total_bytes)`` tuples
+    """
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint,
+               pg_total_relation_size(c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        ORDER BY c.relname
+        """,
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def copied_indexes(cursor):
+    """Non-unique indexes of the card table, which the partitioned table gets as well"""
+    cursor.execute(
+        """
+        SELECT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %s::regclass AND NOT x.indisunique
+        ORDER BY i.relname
+        """,
+        [TABLE],
+    )
+    return cursor.fetchall()
+
+
+def prepare_statements(cursor, strategy, partitions):
+    """The DDL that creates the partitioned copy of the card table"""
+    if strategy not in STRATEGIES:
+        raise PartitioningError(f'Unknown strategy {strategy!r}, use one of {", ".join(STRATEGIES)}')
+
+    if strategy == 'hash':
+        if partitions < 2:
+            raise PartitioningError('Hash partitioning needs at least 2 partitions')
+        # group_id is nullable, so it cannot be part of a primary key
+        statements = [
+            f'CREATE TABLE {NEW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY HASH (group_id)',
+            f'ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {TABLE}_uuid_group_id_key UNIQUE (uuid, group_id)',
+        ]
+        width = len(str(partitions - 1))
+        statements += [
+            f'CREATE TABLE {TABLE}_p{i:0{width}d} PARTITION OF {NEW_TABLE} '
+            f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})'
+            for i in range(partitions)
+        ]
+    else:
+        statements = [
+            f'CREATE TABLE {NEW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY LIST (status)',
+            f'ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {TABLE}_uuid_status_pkey PRIMARY KEY (uuid, status)',
+        ]
+        statements += [
+            f"CREATE TABLE {TABLE}_{value} PARTITION OF {NEW_TABLE} FOR VALUES IN ('{value}')"
+            for value in Card.STATUS_CHOICES.values
+        ]
+        statements.append(f'CREATE TABLE {TABLE}_other PARTITION OF {NEW_TABLE} DEFAULT')
+
+    for name, definition in copied_indexes(cursor):
+        match = INDEX_DEF.match(definition)
+        if match is None:
+            raise PartitioningError(f'Cannot copy index {name}: {definition}')
+        statements.append(f'CREATE INDEX {_temp_name(name, "prt")} ON {NEW_TABLE} {match.group(3)}')
+
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f' ORDER BY conname",
+        [TABLE],
+    )
+    statements += [
+        f'ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {name} {definition}'
+        for name, definition in cursor.fetchall()
+    ]
+
+    statements += [
+        f'CREATE TABLE {PROGRESS_TABLE} (id integer PRIMARY KEY, last_uuid uuid)',
+        f'INSERT INTO {PROGRESS_TABLE} VALUES (1, NULL)',
+        # Rows up to the watermark have been copied, so changes to them must
+        # be repeated on the new table. Taking the progress row FOR SHARE
+        # makes every write wait for a running copy batch, so no row is
+        # missed between a batch's snapshot and its watermark update.
+        f"""
+        CREATE FUNCTION {MIRROR_TRIGGER}() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            copied uuid;
+        BEGIN
+            SELECT last_uuid INTO copied FROM {PROGRESS_TABLE} WHERE id = 1 FOR SHARE;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                IF OLD.uuid <= copied THEN
+                    DELETE FROM {NEW_TABLE} WHERE uuid = OLD.uuid;
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                IF NEW.uuid <= copied THEN
+                    INSERT INTO {NEW_TABLE} SELECT NEW.*;
+                END IF;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        f'CREATE TRIGGER {MIRROR_TRIGGER} AFTER INSERT OR UPDATE OR DELETE ON {TABLE} '
+        f'FOR EACH ROW EXECUTE FUNCTION {MIRROR_TRIGGER}()',
+    ]
+    return statements
+
+
+def prepare(strategy='hash', partitions=16):
+    with transaction.atomic(), connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            raise PartitioningError(f'{TABLE} is already partitioned')
+        if table_exists(cursor, NEW_TABLE):
+            raise PartitioningError(f'{NEW_TABLE} already exists, run the copy step')
+        for statement in prepare_statements(cursor, strategy, partitions):
+            cursor.execute(statement)
+
+
+def copy_batch(batch_size):
+    """
+    Copy the next ``batch_size`` rows after the watermark.
+
+    Returns:
+        ``(rows_copied, finished)``
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'SELECT last_uuid FROM {PROGRESS_TABLE} WHERE id = 1 FOR UPDATE')
+        last = cursor.fetchone()[0]
+        if last is not None and str(last) == MAX_UUID:
+            return 0, True
+
+        after, params = ('uuid > %s AND ', [last]) if last is not None else ('', [])
+        cursor.execute(
+            f'SELECT uuid FROM {TABLE} WHERE {after}TRUE ORDER BY uuid OFFSET %s LIMIT 1',
+            params + [batch_size - 1],
+        )
+        row = cursor.fetchone()
+        # The last batch moves the watermark to the end, so from then on the
+        # trigger mirrors every write
+        upper = row[0] if row else MAX_UUID
+        cursor.execute(
+            f'INSERT INTO {NEW_TABLE} SELECT * FROM {TABLE} WHERE {after}uuid <= %s',
+            params + [upper],
+        )
+        copied = cursor.rowcount
+        cursor.execute(f'UPDATE {PROGRESS_TABLE} SET last_uuid = %s WHERE id = 1', [upper])
+    return copied, row is None
+
+
+def copy(batch_size=10000, progress=None):
+    """Copy every remaining row, calling ``progress(total)`` after each batch"""
+    total = 0
+    finished = False
+    while not finished:
+        copied, finished = copy_batch(batch_size)
+        total += copied
+        if progress is not None:
+            progress(total)
+    return total
+
+
+def copy_finished(cursor):
+    cursor.execute(f'SELECT last_uuid FROM {PROGRESS_TABLE} WHERE id = 1')
+    last = cursor.fetchone()[0]
+    return last is not None and str(last) == MAX_UUID
+
+
+def verify_copy():
+    """
+    Compare the row counts of both tables.
+
+    Once the copy has finished, the trigger changes both tables in the same
+    transaction, so counts taken from one snapshot match from then on. This
+    scans both tables and runs before ``swap`` takes its lock, so writes are
+    not blocked meanwhile.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not copy_finished(cursor):
+            raise PartitioningError('The copy has not finished, run the copy step first')
+        cursor.execute(f'SELECT (SELECT count(*) FROM {TABLE}), (SELECT count(*) FROM {NEW_TABLE})')
+        old_count, new_count = cursor.fetchone()
+    if old_count != new_count:
+        raise PartitioningError(f'{TABLE} has {old_count} rows but {NEW_TABLE} has {new_count}')
+    return new_count
+
+
+def swap(verify=True):
+    """Replace the card table with the partitioned copy, keeping the old table"""
+    if verify:
+        verify_copy()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE')
+        if not copy_finished(cursor):
+            raise PartitioningError('The copy has not finished, run the copy step first')
+
+        cursor.execute(f'DROP TRIGGER {MIRROR_TRIGGER} ON {TABLE}')
+        cursor.execute(f'DROP FUNCTION {MIRROR_TRIGGER}()')
+
+        # The models declare no constraints on foreign keys to cards, these
+        # are left over from a schema created before they did
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE confrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        for table, name in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+
+        # Give the new indexes the names Django's migrations know
+        for name, _ in copied_indexes(cursor):
+            if table_exists(cursor, _temp_name(name, 'prt')):
+                cursor.execute(f'ALTER INDEX {name} RENAME TO {_temp_name(name, "old")}')
+                cursor.execute(f'ALTER INDEX {_temp_name(name, "prt")} RENAME TO {name}')
+
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}')
+        cursor.execute(f'ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}')
+        cursor.execute(f'DROP TABLE {PROGRESS_TABLE}')
@@ -0,0 +1,21 @@
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Compact binary alternative to JSON, selected with
+    ``Accept: application/msgpack`` or ``?format=msgpack``.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Imported here so workers that never serve msgpack do not load it
+        import msgpack
+
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
@@ -0,0 +1,220 @@
+"""
+Review event ingestion and rollups.
+
+Events posted to ``/api/reviews/`` are held in a per-process buffer and
+written with ``bulk_create`` once ``CARDS_REVIEW_BUFFER_SIZE`` events are
+queued or ``CARDS_REVIEW_FLUSH_INTERVAL`` seconds have passed, so a busy
+study session costs one insert per batch instead of one per flip. Events
+still in the buffer are lost if the worker is killed, which is acceptable
+for analytics.
+
+``rollup_reviews`` folds new events into ``CardStats``/``GroupStats`` so
+study views can read difficulty without touching the event table. Events
+are picked up a short while after they are written (see ``rollup``).
+"""
+
+import atexit
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q, Sum
+from django.utils import timezone
+
+from .models import Card, CardStats, GroupStats, ReviewEvent, ReviewRollup
+
+logger = logging.getLogger(__name__)
+
+EVENT = ReviewEvent.EVENT_CHOICES
+
+# ReviewRollup holds a single row
+WATERMARK_ID = 1
+
+
+def difficulty(correct, incorrect):
+    """Share of wrong answers, smoothed so unreviewed cards sit at 0.5"""
+    return (incorrect + 1) / (correct + incorrect + 2)
+
+
+class ReviewEventBuffer:
+    def __init__(self, max_size=None, max_age=None):
+        self.max_size = max_size if max_size is not None else getattr(settings, 'CARDS_REVIEW_BUFFER_SIZE', 500)
+        self.max_age = max_age if max_age is not None else getattr(settings, 'CARDS_REVIEW_FLUSH_INTERVAL', 5)
+        self._events = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, events):
+        with self._lock:
+            self._events.extend(events)
+            full = len(self._events) >= self.max_size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.max_age, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not events:
+            return 0
+        try:
+            # Cards may have been deleted or moved to cold storage since the
+            # events were accepted; their events are dropped
+            known = resolve_cards({event.card_id for event in events})
+            events = [event for event in events if event.card_id in known]
+            ReviewEvent.objects.bulk_create(events, batch_size=1000)
+        except Exception:
+            logger.exception('Dropped %d review events', len(events))
+            return 0
+        return len(events)
+
+    def _flush_from_timer(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+
+review_buffer = ReviewEventBuffer()
+atexit.register(review_buffer.flush)
+
+
+def rollup(batch_size=100000, delay=None):
+    """
+    Fold events newer than the watermark into the stats tables.
+
+    Event ids are allocated when an insert starts but only become visible
+    when it commits, so a new id can be visible while a lower one is still
+    in flight; rolling up past it would skip the lower one for good. Only
+    events recorded more than ``delay`` seconds ago (default
+    ``CARDS_REVIEW_ROLLUP_DELAY``) move the watermark, the rest wait for the
+    next run. Each batch locks the watermark row, so concurrent runs never
+    fold the same events twice.
+
+    Returns:
+        Number of events processed
+    """
+    if delay is None:
+        delay = getattr(settings, 'CARDS_REVIEW_ROLLUP_DELAY', 60)
+    ReviewRollup.objects.get_or_create(pk=WATERMARK_ID)
+    last_id = ReviewRollup.objects.values_list('last_event_id', flat=True).get(pk=WATERMARK_ID)
+    max_id = ReviewEvent.objects.filter(
+        id__gt=last_id, recorded_at__lte=timezone.now() - timedelta(seconds=delay),
+    ).aggregate(max_id=Max('id'))['max_id'] or 0
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            watermark = ReviewRollup.objects.select_for_update().get(pk=WATERMARK_ID)
+            last_id = watermark.last_event_id
+            if last_id >= max_id:
+                break
+            upper = min(last_id + batch_size, max_id)
+            rows = (
+                ReviewEvent.objects.filter(id__gt=last_id, id__lte=upper)
+                # Card foreign keys have no database constraint, skip events
+                # whose card has gone since
+                .filter(Exists(Card.objects.filter(uuid=OuterRef('card_id'))))
+                .order_by()
+                .values('card_id')
+                .annotate(
+                    flips=Count('id', filter=Q(event=EVENT.FLIP)),
+                    correct=Count('id', filter=Q(event=EVENT.CORRECT)),
+                    incorrect=Count('id', filter=Q(event=EVENT.INCORRECT)),
+                    events=Count('id'),
+                    last_reviewed_at=Max('occurred_at'),
+                )
+            )
+            events = _merge_card_stats(rows)
+            watermark.last_event_id = upper
+            watermark.events += events
+            watermark.save(update_fields=['last_event_id', 'events', 'updated_at'])
+        total += events
+
+    if total:
+        refresh_group_stats()
+    return total
+
+
+def _merge_card_stats(rows):
+    rows = {row['card_id']: row for row in rows}
+    existing = CardStats.objects.in_bulk(list(rows))
+    to_create, to_update = [], []
+    events = 0
+    now = timezone.now()
+
+    for card_id, row in rows.items():
+        events += row['events']
+        stats = existing.get(card_id)
+        if stats is None:
+            stats = CardStats(card_id=card_id)
+            to_create.append(stats)
+        else:
+            to_update.append(stats)
+        stats.flips += row['flips']
+        stats.correct += row['correct']
+        stats.incorrect += row['incorrect']
+        stats.difficulty = difficulty(stats.correct, stats.incorrect)
+        if stats.last_reviewed_at is None or row['last_reviewed_at'] > stats.last_reviewed_at:
+            stats.last_reviewed_at = row['last_reviewed_at']
+        stats.updated_at = now
+
+    CardStats.objects.bulk_create(to_create, batch_size=1000)
+    CardStats.objects.bulk_update(
+        to_update,
+        ['flips', 'correct', 'incorrect', 'difficulty', 'last_reviewed_at', 'updated_at'],
+        batch_size=1000,
+    )
+    return events
+
+
+def refresh_group_stats():
+    """Recompute GroupStats from CardStats, one aggregate query for all groups"""
+    rows = (
+        CardStats.objects.filter(card__group__isnull=False)
+        .values('card__group_id')
+        .annotate(
+            reviewed_cards=Count('card_id'),
+            flips=Sum('flips'),
+            correct=Sum('correct'),
+            incorrect=Sum('incorrect'),
+            last_reviewed_at=Max('last_reviewed_at'),
+        )
+        .order_by()
+    )
+    stats = [
+        GroupStats(
+            group_id=row['card__group_id'],
+            reviewed_cards=row['reviewed_cards'],
+            flips=row['flips'],
+            correct=row['correct'],
+            incorrect=row['incorrect'],
+            difficulty=difficulty(row['correct'], row['incorrect']),
+            last_reviewed_at=row['last_reviewed_at'],
+        )
+        for row in rows
+    ]
+    GroupStats.objects.bulk_create(
+        stats,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['group'],
+        update_fields=['reviewed_cards', 'flips', 'correct', 'incorrect', 'difficulty', 'last_reviewed_at', 'updated_at'],
+    )
+
+
+def resolve_cards(uuids):
+    """Return the subset of card uuids that exist, in a single query"""
+    return set(Card.objects.filter(uuid__in=uuids).order_by().values_list('uuid', flat=True))
@@ -1,15 +1,54 @@
 from rest_framework import serializers
-from .models import Card, CardGroup
+from rest_framework.permissions import SAFE_METHODS
+from .dedup import normalize_name
+from .models import Card, CardGroup, CardStats, GroupStats, ImportJob, ReviewEvent
 
 
-class CardGroupSerializer(serializers.ModelSerializer):
+def requested_fields(request):
+    """Field names from ?fields=a,b,c on read requests, or None for all fields"""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(',') if field.strip()}
+
+
+class SparseFieldsetMixin:
+    """Drop serializer fields that were not asked for with ?fields="""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields:
+            if not fields & set(self.fields):
+                # Unknown names are ignored, but all of them would return empty objects
+                raise serializers.ValidationError(
+                    {'fields': f'No valid field names given; choose from {", ".join(self.fields)}.'}
+                )
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+class CardGroupSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = CardGroup
         fields = ['id', 'name', 'image', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+        # validate_name covers the exact-match unique check, skip the extra query
+        extra_kwargs = {'name': {'validators': []}}
+
+    def validate_name(self, value):
+        """Group names are unique regardless of case"""
+        existing = CardGroup.objects.by_name(value)
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError('A group with this name already exists.')
+        return value
 
 
-class CardSerializer(serializers.ModelSerializer):
+class CardSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     group_name = serializers.CharField(source='group.name', read_only=True)
     user_username = serializers.CharField(source='user.username', read_only=True)
     
@@ -27,4 +66,73 @@ class CardCreateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Card
-        fields = ['name', 'group', 'description', 'image', 'status']
\ No newline at end of file
+        fields = ['name', 'group', 'description', 'image', 'status']
+
+    def validate(self, attrs):
+        """Optionally reject cards whose normalized name already exists in the group"""
+        if self.context.get('reject_duplicates'):
+            existing = Card.objects.filter(
+                group=attrs.get('group'),
+                name_key=normalize_name(attrs.get('name'))[:255],
+            ).values_list('uuid', flat=True).first()
+            if existing:
+                raise serializers.ValidationError(
+                    {'name': f'A card with this name already exists in the group ({existing})'},
+                    code='duplicate',
+                )
+        return attrs
+
+
+class ReviewEventSerializer(serializers.Serializer):
+    """A single review event; cards are resolved in bulk by the view, not per event"""
+    card = serializers.UUIDField()
+    event = serializers.ChoiceField(choices=ReviewEvent.EVENT_CHOICES.choices)
+    response_ms = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    occurred_at = serializers.DateTimeField(required=False)
+
+
+class CardStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CardStats
+        fields = ['card', 'flips', 'correct', 'incorrect', 'difficulty', 'last_reviewed_at']
+
+
+class GroupStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GroupStats
+        fields = ['group', 'reviewed_cards', 'flips', 'correct', 'incorrect', 'difficulty', 'last_reviewed_at']
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    group = serializers.PrimaryKeyRelatedField(queryset=CardGroup.objects.all(), required=False)
+    group_name = serializers.CharField(
+        write_only=True, required=False,
+        max_length=CardGroup._meta.get_field('name').max_length,
+    )
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'file', 'group', 'group_name', 'card_status', 'skip_duplicates',
+            'status', 'processed_rows', 'created_cards', 'skipped_rows', 'failed_rows',
+            'errors', 'rows_per_second', 'message',
+            'created_at', 'started_at', 'finished_at', 'updated_at',
+        ]
+        read_only_fields = [
+            'id', 'status', 'processed_rows', 'created_cards', 'skipped_rows', 'failed_rows',
+            'errors', 'rows_per_second', 'message',
+            'created_at', 'started_at', 'finished_at', 'updated_at',
+        ]
+
+    def validate(self, attrs):
+        """Accept either a group id or a group name"""
+        if not attrs.get('group') and not attrs.get('group_name'):
+            raise serializers.ValidationError({'group': 'Provide group or group_name.'})
+        return attrs
+
+    def create(self, validated_data):
+        """Create the named group if needed, only once the job itself is valid"""
+        group_name = validated_data.pop('group_name', '')
+        if not validated_data.get('group'):
+            validated_data['group'], created = CardGroup.objects.get_or_create_by_name(group_name)
+        return super().create(validated_data)
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import mix, suggest
+from .models import Card
+
+
+@receiver(post_save, sender=Card)
+@receiver(post_delete, sender=Card)
+def invalidate_card_caches(sender, instance=None, group_ids=(), **kwargs):
+    """
+    Drop the cached prefix indexes and id pools of the groups whose cards were
+    written or removed: the card's group, the one it was loaded with if it
+    moved, or ``group_ids`` for bulk writes that skip the signals
+    """
+    group_ids = set(group_ids)
+    if instance is not None:
+        group_ids |= {instance.group_id, getattr(instance, '_loaded_group_id', instance.group_id)}
+    suggest.bump_version(group_ids)
+    mix.bump_version(group_ids)
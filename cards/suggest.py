@@ -0,0 +1,141 @@
+"""
+In-process prefix index used by the type-ahead suggestion endpoint.
+
+Card names are kept per group in a sorted array, so a lookup is a binary
+search followed by a short forward scan. Indexes are built lazily on first
+use, evicted least-recently-used once ``CARDS_SUGGEST_MAX_GROUPS`` groups are
+loaded, and thrown away when their group's version is bumped by the card
+signals (see ``cards/signals.py``) or when they are older than
+``CARDS_SUGGEST_TTL`` seconds. Versions are kept per group, plus one for the
+index over all cards, so a write only reloads the indexes it affects. They
+live in the default cache, which must be shared by all processes
+(``REDIS_URL``) for writes in one worker or management command to reach the
+others.
+
+Groups with more than ``CARDS_SUGGEST_MAX_NAMES`` cards are not indexed; their
+suggestions come from an ``istartswith`` query instead, so no names are lost.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Card
+
+VERSION_CACHE_KEY = 'cards:suggest:version:{}'
+
+# Key used for the index over all cards, when no group is requested
+ALL_GROUPS = None
+
+
+def version_key(group_id):
+    return VERSION_CACHE_KEY.format('all' if group_id is ALL_GROUPS else group_id)
+
+
+def bump_version(group_ids):
+    """
+    Invalidate the loaded prefix indexes of ``group_ids`` and the index over
+    all cards, in every process sharing the cache
+    """
+    for key in {version_key(group_id) for group_id in group_ids} | {version_key(ALL_GROUPS)}:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def _cards(group_id):
+    queryset = Card.objects.all()
+    if group_id is not ALL_GROUPS:
+        queryset = queryset.filter(group_id=group_id)
+    return queryset
+
+
+def query_suggestions(prefix, group_id, limit):
+    """Suggestions straight from the database, for groups too large to index"""
+    rows = (
+        _cards(group_id).filter(name__istartswith=prefix)
+        .order_by('name')
+        .values_list('name', 'uuid')[:limit]
+    )
+    return [{'uuid': str(uuid), 'name': name} for name, uuid in rows]
+
+
+class PrefixIndex:
+    """Sorted array of (casefolded name, name, uuid) for one group"""
+
+    def __init__(self, entries):
+        entries = sorted(entries)
+        self._keys = [entry[0] for entry in entries]
+        self._entries = [(entry[1], entry[2]) for entry in entries]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def lookup(self, prefix, limit):
+        key = prefix.casefold()
+        keys = self._keys
+        results = []
+        i = bisect_left(keys, key)
+        while i < len(keys) and len(results) < limit and keys[i].startswith(key):
+            name, uuid = self._entries[i]
+            results.append({'uuid': uuid, 'name': name})
+            i += 1
+        return results
+
+    @classmethod
+    def load(cls, group_id, max_names):
+        """The index for a group, or None if it has more than ``max_names`` cards"""
+        rows = list(_cards(group_id).order_by().values_list('name', 'uuid')[:max_names + 1])
+        if len(rows) > max_names:
+            return None
+        return cls((name.casefold(), name, str(uuid)) for name, uuid in rows)
+
+
+class SuggestionIndex:
+    """LRU registry of per-group prefix indexes for the current process"""
+
+    def __init__(self, max_groups=None, max_names=None, ttl=None):
+        self.max_groups = max_groups or getattr(settings, 'CARDS_SUGGEST_MAX_GROUPS', 64)
+        self.max_names = max_names or getattr(settings, 'CARDS_SUGGEST_MAX_NAMES', 50000)
+        self.ttl = ttl or getattr(settings, 'CARDS_SUGGEST_TTL', 300)
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def _get_index(self, group_id):
+        version = cache.get(version_key(group_id), 0)
+        with self._lock:
+            entry = self._indexes.get(group_id)
+            if entry is not None and entry[1] == version and time.monotonic() - entry[0] < self.ttl:
+                self._indexes.move_to_end(group_id)
+                return entry[2]
+
+        # Build outside the lock so one slow load does not block other groups.
+        # Groups that are too large are remembered as None. A write during the
+        # load bumps the version past the one stored here, so it reloads again.
+        index = PrefixIndex.load(group_id, self.max_names)
+        with self._lock:
+            self._indexes[group_id] = (time.monotonic(), version, index)
+            self._indexes.move_to_end(group_id)
+            while len(self._indexes) > self.max_groups:
+                self._indexes.popitem(last=False)
+        return index
+
+    def suggest(self, prefix, group_id=ALL_GROUPS, limit=10):
+        if not prefix:
+            return []
+        index = self._get_index(group_id)
+        if index is None:
+            return query_suggestions(prefix, group_id, limit)
+        return index.lookup(prefix, limit)
+
+
+suggestion_index = SuggestionIndex()
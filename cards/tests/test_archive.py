@@ -0,0 +1,82 @@
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.db.models.signals import post_delete
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cards import archive, suggest
+from cards.models import ArchivedCard, Card, CardGroup, CardStats, ReviewEvent
+from cards.reviews import ReviewEventBuffer, rollup
+
+STATUS = Card.STATUS_CHOICES
+
+
+class ColdStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = CardGroup.objects.create(name='German')
+        cls.card = Card.objects.create(name='Hund', description='dog', group=cls.group, status=STATUS.ARCHIVED)
+        Card.objects.filter(uuid=cls.card.uuid).update(updated_at=timezone.now() - timedelta(days=365))
+
+    def test_archiving_removes_events_and_stats(self):
+        ReviewEvent.objects.create(card=self.card, event='correct')
+        rollup(delay=0)
+        self.assertTrue(CardStats.objects.filter(card=self.card).exists())
+        version_key = suggest.version_key(self.group.id)
+        version = suggest.cache.get(version_key, 0)
+
+        self.assertEqual(archive.archive()[0], 1)
+        self.assertFalse(Card.objects.exists())
+        self.assertFalse(ReviewEvent.objects.exists())
+        self.assertFalse(CardStats.objects.exists())
+        self.assertNotEqual(suggest.cache.get(version_key, 0), version)
+
+        card, stats = archive.unpack(ArchivedCard.objects.get())
+        self.assertEqual((card.name, stats.correct), ('Hund', 1))
+
+    def test_archiving_invalidates_caches_once_per_batch(self):
+        other = CardGroup.objects.create(name='Spanish')
+        perro = Card.objects.create(name='Perro', description='dog', group=other, status=STATUS.ARCHIVED)
+        Card.objects.filter(uuid=perro.uuid).update(updated_at=timezone.now() - timedelta(days=365))
+        deleted = []
+
+        def on_delete(sender, instance, **kwargs):
+            deleted.append(instance)
+
+        post_delete.connect(on_delete, sender=Card)
+        self.addCleanup(post_delete.disconnect, on_delete, sender=Card)
+        with mock.patch('cards.archive.invalidate_card_caches') as invalidate:
+            self.assertEqual(archive.archive()[0], 2)
+        self.assertEqual(deleted, [])
+        invalidate.assert_called_once_with(Card, group_ids={self.group.id, other.id})
+
+    def test_request_that_loses_the_restore_race_still_finds_the_card(self):
+        archive.archive()
+        restore = archive.restore
+
+        def restored_by_another_request(uuids):
+            restore(uuids)
+            return set()
+
+        with mock.patch('cards.views.archive.restore', side_effect=restored_by_another_request):
+            response = APIClient().get(f'/api/cards/{self.card.uuid}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Hund')
+
+    def test_events_for_cold_cards_are_dropped(self):
+        buffer = ReviewEventBuffer(max_size=10, max_age=60)
+        other = Card.objects.create(name='Katze', description='cat', group=self.group)
+        buffer.add([ReviewEvent(card=self.card, event='flip'), ReviewEvent(card=other, event='flip')])
+        archive.archive()
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(list(ReviewEvent.objects.values_list('card_id', flat=True)), [other.uuid])
+
+    def test_rollup_skips_events_of_missing_cards(self):
+        # Card foreign keys have no database constraint, see Card.uuid
+        ReviewEvent.objects.create(card_id=uuid.uuid4(), event='flip')
+        ReviewEvent.objects.create(card=self.card, event='flip')
+        self.assertEqual(rollup(delay=0), 1)
+        self.assertEqual(list(CardStats.objects.values_list('card_id', flat=True)), [self.card.uuid])
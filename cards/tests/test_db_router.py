@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from cards.models import Card
+from flashcards import db_router
+from flashcards.db_router import PIN_COOKIE, PrimaryReplicaRouter, ReplicaPinMiddleware
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_RETRY_SECONDS=30)
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.primary = SimpleNamespace(in_atomic_block=False)
+        self.replica = mock.Mock()
+        connections = {'default': self.primary, 'replica': self.replica}
+        patcher = mock.patch.object(db_router, 'connections', connections)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(db_router._down_until.clear)
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, view=None):
+        """Run ``view`` inside the middleware, returning the response and the alias a read went to"""
+        routed = {}
+
+        def get_response(request):
+            if view is not None:
+                view()
+            routed['read'] = self.router.db_for_read(Card)
+            return mock.MagicMock()
+
+        response = ReplicaPinMiddleware(get_response)(request)
+        return response, routed['read']
+
+    def test_safe_requests_read_from_the_replica(self):
+        _, alias = self.route(self.factory.get('/api/cards/'))
+        self.assertEqual(alias, 'replica')
+
+    def test_unsafe_requests_and_writes_pin_to_the_primary(self):
+        _, alias = self.route(self.factory.post('/api/cards/'))
+        self.assertEqual(alias, 'default')
+        response, alias = self.route(self.factory.get('/api/cards/'), lambda: self.router.db_for_write(Card))
+        self.assertEqual(alias, 'default')
+        response.set_cookie.assert_called_once()
+        self.assertEqual(response.set_cookie.call_args.args[0], PIN_COOKIE)
+
+    def test_pin_cookie(self):
+        request = self.factory.get('/api/cards/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        response, alias = self.route(request)
+        self.assertEqual(alias, 'default')
+        response.set_cookie.assert_not_called()
+
+    def test_atomic_blocks_read_from_the_primary(self):
+        self.primary.in_atomic_block = True
+        _, alias = self.route(self.factory.get('/api/cards/'))
+        self.assertEqual(alias, 'default')
+
+    def test_unreachable_replica_falls_back_and_is_skipped(self):
+        self.replica.ensure_connection.side_effect = OperationalError
+        _, alias = self.route(self.factory.get('/api/cards/'))
+        self.assertEqual(alias, 'default')
+        self.replica.ensure_connection.side_effect = None
+        _, alias = self.route(self.factory.get('/api/cards/'))
+        self.assertEqual(alias, 'default')
+        self.assertEqual(self.replica.ensure_connection.call_count, 1)
+
+    def test_failed_replica_query_reruns_the_view_on_the_primary(self):
+        request = self.factory.get('/api/cards/')
+        request.resolver_match = (lambda request: self.router.db_for_read(Card), (), {})
+
+        def get_response(request):
+            self.assertEqual(self.router.db_for_read(Card), 'replica')
+            # What the handler does when the view raises
+            return middleware.process_exception(request, OperationalError())
+
+        middleware = ReplicaPinMiddleware(get_response)
+        self.assertEqual(middleware(request), 'default')
+        self.replica.close.assert_called_once()
+        _, alias = self.route(self.factory.get('/api/cards/'))
+        self.assertEqual(alias, 'default')
+        self.assertEqual(self.replica.ensure_connection.call_count, 1)
+
+    def test_other_failures_are_not_retried(self):
+        middleware = ReplicaPinMiddleware(lambda request: None)
+        for request, exception, read in (
+            (self.factory.get('/api/cards/'), ValueError(), True),
+            (self.factory.get('/api/cards/'), OperationalError(), False),
+            (self.factory.post('/api/cards/'), OperationalError(), False),
+        ):
+            with self.subTest(method=request.method, exception=exception, read=read):
+                token = db_router._replicas_read.set(('replica',) if read else ())
+                self.addCleanup(db_router._replicas_read.reset, token)
+                self.assertIsNone(middleware.process_exception(request, exception))
+        self.replica.close.assert_not_called()
+
+    def test_outside_requests_everything_stays_on_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Card), 'default')
+
+    def test_state_does_not_leak_between_requests(self):
+        self.route(self.factory.post('/api/cards/'), lambda: self.router.db_for_write(Card))
+        _, alias = self.route(self.factory.get('/api/cards/'))
+        self.assertEqual(alias, 'replica')
+
+
+class PinCookieTests(TestCase):
+    def test_writes_set_the_pin_cookie(self):
+        response = self.client.post('/api/groups/', {'name': 'German'})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertNotIn(PIN_COOKIE, self.client.get('/api/groups/').cookies)
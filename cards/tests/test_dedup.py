@@ -0,0 +1,69 @@
+import unicodedata
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from cards.dedup import MinHasher, find_duplicate_clusters, normalize_name, trigrams
+from cards.models import Card, CardGroup
+
+
+class NormalizeNameTests(TestCase):
+    def test_case_umlauts_and_punctuation(self):
+        self.assertEqual(normalize_name('Mädchen'), 'maedchen')
+        self.assertEqual(normalize_name('MAEDCHEN!'), 'maedchen')
+        self.assertEqual(normalize_name('Straße'), 'strasse')
+        self.assertEqual(normalize_name('café'), 'cafe')
+        self.assertEqual(normalize_name(None), '')
+
+    def test_decomposed_input_matches_composed(self):
+        decomposed = unicodedata.normalize('NFD', 'Mädchen')
+        self.assertNotEqual(decomposed, 'Mädchen')
+        self.assertEqual(normalize_name(decomposed), 'maedchen')
+
+    def test_leading_and_trailing_articles(self):
+        self.assertEqual(normalize_name('der Hund'), 'hund')
+        self.assertEqual(normalize_name('Hund, der'), 'hund')
+        self.assertEqual(normalize_name('The dog'), 'dog')
+        # A lone article is the word itself
+        self.assertEqual(normalize_name('Die'), 'die')
+
+
+class MinHashTests(TestCase):
+    def test_signatures_are_reproducible(self):
+        shingles = trigrams('apfel')
+        self.assertEqual(MinHasher().signature(shingles), MinHasher().signature(shingles))
+        self.assertEqual(len(MinHasher().band_keys(MinHasher().signature(shingles))), 8)
+
+    def test_bands_must_divide_permutations(self):
+        with self.assertRaises(ValueError):
+            MinHasher(num_perm=30, bands=8)
+
+    def test_clusters(self):
+        cards = [
+            (1, 'der Apfel'), (2, 'Apfel'), (3, 'Äpfelchen'),
+            (4, 'Bananen'), (5, 'Banane'), (6, 'Kirsche'),
+        ]
+        clusters = sorted(sorted(uuid for uuid, _ in c) for c in find_duplicate_clusters(cards, threshold=0.6))
+        self.assertEqual(clusters, [[1, 2], [4, 5]])
+        self.assertEqual(find_duplicate_clusters(cards[-1:]), [])
+
+
+class DuplicateCheckTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = CardGroup.objects.create(name='German')
+        cls.card = Card.objects.create(name='der Hund', description='dog', group=cls.group)
+
+    def test_reject_duplicates(self):
+        client = APIClient()
+        data = {'name': 'Hund', 'group': self.group.id, 'description': 'dog'}
+        response = client.post('/api/cards/?reject_duplicates=true', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post('/api/cards/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_duplicates_of_filter(self):
+        response = APIClient().get('/api/cards/', {'group': self.group.id, 'duplicates_of': 'HUND', 'fields': 'uuid'})
+        self.assertEqual([r['uuid'] for r in response.data['results']], [str(self.card.uuid)])
+        response = APIClient().get('/api/cards/', {'group': self.group.id, 'duplicates_of': 'Katze'})
+        self.assertEqual(response.data['results'], [])
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cards.models import Card, CardGroup
+
+STATUS = Card.STATUS_CHOICES
+
+
+class CardFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('learner')
+        cls.german = CardGroup.objects.create(name='German')
+        cls.spanish = CardGroup.objects.create(name='Spanish')
+        cls.hund = Card.objects.create(name='Hund', description='dog', group=cls.german, user=cls.user)
+        cls.katze = Card.objects.create(name='Katze', description='cat', group=cls.german, status=STATUS.ARCHIVED)
+        cls.perro = Card.objects.create(name='Perro', description='dog', group=cls.spanish)
+        Card.objects.filter(uuid=cls.perro.uuid).update(updated_at=timezone.now() - timedelta(days=2))
+
+    def names(self, **params):
+        response = APIClient().get('/api/cards/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return sorted(card['name'] for card in response.data['results'])
+
+    def test_filters(self):
+        self.assertEqual(self.names(group=self.german.id), ['Hund', 'Katze'])
+        self.assertEqual(self.names(group=self.german.id, status='archived'), ['Katze'])
+        self.assertEqual(self.names(user=self.user.id), ['Hund'])
+        since = (timezone.now() - timedelta(days=1)).replace(tzinfo=None).isoformat()
+        self.assertEqual(self.names(updated_since=since), ['Hund', 'Katze'])
+
+    def test_invalid_values_are_bad_requests(self):
+        for params in (
+            {'status': 'gone'},
+            {'user': 'abc'},
+            {'user': '²'},
+            {'group': '-1'},
+            {'updated_since': 'yesterday'},
+            {'updated_since': '2025-02-30T00:00:00'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(APIClient().get('/api/cards/', params).status_code, 400)
+
+
+class GroupLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = CardGroup.objects.create(name='Straße')
+
+    def test_name_filters(self):
+        client = APIClient()
+        response = client.get('/api/groups/', {'name': 'straße'})
+        self.assertEqual(response.data['results'], [])
+        response = client.get('/api/groups/', {'name__iexact': 'STRAßE'})
+        self.assertEqual([g['id'] for g in response.data['results']], [self.group.id])
+
+    def test_by_name(self):
+        self.assertEqual(list(CardGroup.objects.by_name('sTRAßE')), [self.group])
+        self.assertEqual(list(CardGroup.objects.by_name('Strasse')), [])
+
+    def test_get_or_create(self):
+        client = APIClient()
+        response = client.post('/api/groups/get_or_create/', {'name': ' straße '}, format='json')
+        self.assertEqual((response.status_code, response.data['id']), (200, self.group.id))
+        response = client.post('/api/groups/get_or_create/', {'name': 'Spanish'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(CardGroup.objects.get_or_create_by_name('SPANISH'), (CardGroup.objects.get(name='Spanish'), False))
+
+    def test_get_or_create_validates_the_name(self):
+        client = APIClient()
+        self.assertEqual(client.post('/api/groups/get_or_create/', {'name': ' '}, format='json').status_code, 400)
+        response = client.post('/api/groups/get_or_create/', {'name': 'x' * 256}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.data)
+        self.assertFalse(CardGroup.objects.filter(name__startswith='xxx').exists())
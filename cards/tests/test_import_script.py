@@ -0,0 +1,104 @@
+import contextlib
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+spec = importlib.util.spec_from_file_location(
+    'csv_to_flashcards', Path(settings.BASE_DIR) / 'scripts' / 'csv_to_flashcards.py',
+)
+csv_to_flashcards = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(csv_to_flashcards)
+
+ImageCache = csv_to_flashcards.ImageCache
+FlashCardUploader = csv_to_flashcards.FlashCardUploader
+
+
+class ImageCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+    def test_keys_ignore_case_and_whitespace_but_not_provider(self):
+        key = ImageCache.make_key('openai:dall-e-3', 'A  red\nApple')
+        self.assertEqual(key, ImageCache.make_key('openai:dall-e-3', 'a red apple'))
+        self.assertNotEqual(key, ImageCache.make_key('replicate:sd', 'a red apple'))
+
+    def test_get_put_and_stats(self):
+        cache = ImageCache(self.cache_dir)
+        self.assertIsNone(cache.get('k'))
+        cache.put('k', b'image')
+        self.assertEqual(cache.get('k'), b'image')
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': 5})
+
+    def test_survives_restarts(self):
+        ImageCache(self.cache_dir).put('k', b'image')
+        cache = ImageCache(self.cache_dir)
+        self.assertEqual(cache.stats()['bytes'], 5)
+        self.assertEqual(cache.get('k'), b'image')
+
+    def test_least_recently_used_are_evicted(self):
+        cache = ImageCache(self.cache_dir, max_bytes=10)
+        cache.put('a', b'aaaa')
+        cache.put('b', b'bbbb')
+        # Touch a so b is the oldest
+        with mock.patch.object(csv_to_flashcards.time, 'time', return_value=cache._entries['b'][0] + 1):
+            cache.get('a')
+        cache.put('c', b'cccc')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'aaaa')
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['a.img', 'c.img'])
+
+    def test_oversized_images_are_not_cached(self):
+        cache = ImageCache(self.cache_dir, max_bytes=3)
+        cache.put('k', b'image')
+        self.assertIsNone(cache.get('k'))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+
+class CreateCardTests(SimpleTestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        self.cache = ImageCache(cache_dir)
+        self.uploader = FlashCardUploader('http://flashcards.test', image_cache=self.cache)
+        self.uploader.openai_client = mock.Mock()
+        self.uploader.session = mock.Mock()
+        self.uploader.session.post.return_value = mock.Mock(status_code=201)
+        self.uploader.session.get.return_value = mock.Mock(status_code=200, json=lambda: {'results': []})
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+
+    def test_cached_images_are_not_generated_again(self):
+        key = ImageCache.make_key(f'openai:{csv_to_flashcards.OPENAI_IMAGE_MODEL}', 'a dog')
+        self.cache.put(key, b'jpeg')
+        with mock.patch.object(self.uploader, 'generate_image_openai') as generate:
+            self.assertTrue(self.uploader.create_card('Hund', 'dog', 1, 'a dog'))
+        generate.assert_not_called()
+        files = self.uploader.session.post.call_args.kwargs['files']
+        self.assertEqual(files['image'][1], b'jpeg')
+
+    def test_generated_images_are_cached(self):
+        with mock.patch.object(self.uploader, 'generate_image_openai', return_value='http://img.test/1.jpg'), \
+                mock.patch.object(self.uploader, 'download_image', return_value=b'jpeg') as download:
+            self.uploader.create_card('Hund', 'dog', 1, 'a dog')
+            self.uploader.create_card('der Hund', 'dog', 2, 'A dog')
+        download.assert_called_once()
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_duplicates_are_skipped_before_generating(self):
+        self.uploader.skip_duplicates = True
+        self.uploader.session.get.return_value = mock.Mock(
+            status_code=200, json=lambda: {'results': [{'uuid': 'abc'}]},
+        )
+        with mock.patch.object(self.uploader, 'generate_image_openai') as generate:
+            self.assertFalse(self.uploader.create_card('Hund', 'dog', 1, 'a dog'))
+        generate.assert_not_called()
+        self.uploader.session.post.assert_not_called()
+        self.assertEqual(self.uploader.session.get.call_args.kwargs['params']['duplicates_of'], 'Hund')
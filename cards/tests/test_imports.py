@@ -0,0 +1,128 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cards import imports
+from cards.imports import claim_job, process_job, requeue_stale_jobs
+from cards.models import Card, CardGroup, ImportJob
+
+JOB_STATUS = ImportJob.STATUS_CHOICES
+
+CSV = (
+    'German Word,English Translation\n'
+    'Hund,dog\n'
+    'Katze,\n'
+    'der Hund,the dog\n'
+    'Maus,mouse\n'
+    f'{"x" * 300},too long\n'
+    'Vogel,bird\n'
+)
+
+
+class ImportJobTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.group = CardGroup.objects.create(name='German')
+
+    def queue(self, content=CSV, **kwargs):
+        job = ImportJob(group=self.group, **kwargs)
+        job.file.save('words.csv', ContentFile(content.encode()), save=False)
+        job.save()
+        return job
+
+    def names(self):
+        return sorted(Card.objects.filter(group=self.group).values_list('name', flat=True))
+
+    def test_import_with_error_rows(self):
+        self.queue()
+        job = process_job(claim_job(), batch_size=2)
+        self.assertEqual(job.status, JOB_STATUS.DONE)
+        self.assertEqual(self.names(), ['Hund', 'Maus', 'Vogel', 'der Hund'])
+        job.refresh_from_db()
+        self.assertEqual((job.processed_rows, job.created_cards, job.failed_rows), (6, 4, 2))
+        self.assertEqual(job.errors, [
+            {'row': 2, 'error': 'missing name or description'},
+            {'row': 5, 'error': 'name is too long'},
+        ])
+        self.assertIsNotNone(job.finished_at)
+
+    def test_skip_duplicates(self):
+        Card.objects.create(name='Maus', description='mouse', group=self.group)
+        self.queue(skip_duplicates=True)
+        job = process_job(claim_job())
+        self.assertEqual(self.names(), ['Hund', 'Maus', 'Vogel'])
+        self.assertEqual(job.skipped_rows, 2)
+
+    def test_resume_from_processed_rows(self):
+        self.queue(processed_rows=3, created_cards=2)
+        job = process_job(claim_job(), batch_size=2)
+        self.assertEqual(self.names(), ['Maus', 'Vogel'])
+        self.assertEqual((job.processed_rows, job.created_cards), (6, 4))
+
+    def test_bad_file_fails_the_job(self):
+        self.queue('a,b\n1,2\n')
+        job = process_job(claim_job())
+        self.assertEqual(job.status, JOB_STATUS.FAILED)
+        self.assertIn('columns', ImportJob.objects.get().message)
+
+    def test_claim_order_and_empty_queue(self):
+        first, second = self.queue(), self.queue()
+        self.assertEqual(claim_job().pk, first.pk)
+        self.assertEqual(claim_job().pk, second.pk)
+        self.assertIsNone(claim_job())
+
+    def test_requeue_stale_jobs(self):
+        job = self.queue()
+        claim_job()
+        self.assertEqual(requeue_stale_jobs(60), 0)
+        ImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(seconds=61))
+        self.assertEqual(requeue_stale_jobs(60), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (JOB_STATUS.QUEUED, ''))
+
+    def test_worker_stops_once_its_job_was_requeued(self):
+        self.queue()
+        job = claim_job()
+        # Requeued and claimed by another worker while this one was stalled
+        ImportJob.objects.filter(pk=job.pk).update(worker='other:1')
+        with mock.patch.object(imports.logger, 'warning') as warning:
+            process_job(job, batch_size=2)
+        warning.assert_called_once()
+        self.assertEqual(self.names(), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.processed_rows), (JOB_STATUS.RUNNING, 'other:1', 0))
+
+
+class ImportJobApiTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def post(self, **data):
+        upload = SimpleUploadedFile('words.csv', CSV.encode())
+        return APIClient().post('/api/imports/', {'file': upload, **data})
+
+    def test_group_name_creates_the_group(self):
+        response = self.post(group_name=' German ')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(ImportJob.objects.get().group, CardGroup.objects.get(name='German'))
+
+    def test_invalid_jobs_do_not_create_groups(self):
+        response = self.post(group_name='x' * 256)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('group_name', response.data)
+        response = APIClient().post('/api/imports/', {'group_name': 'German'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.data)
+        self.assertEqual(self.post().status_code, 400)
+        self.assertFalse(CardGroup.objects.exists())
@@ -0,0 +1,92 @@
+import uuid
+from collections import Counter
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from cards.mix import CardPools, IdPool, allocate, interleave, parse_weights
+from cards.models import Card, CardGroup
+
+
+class ParseWeightsTests(TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_weights('1:70, 2:30,3,'), {1: 70.0, 2: 30.0, 3: 1.0})
+        self.assertEqual(parse_weights(''), {})
+
+    def test_invalid(self):
+        for value in ('x:1', '1:abc', '1:0', '1:-2', '1:nan', '1:inf', '1:-inf'):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_weights(value)
+
+
+class AllocateTests(TestCase):
+    def test_split_by_weight(self):
+        self.assertEqual(allocate(10, {1: 70, 2: 30}, {1: 100, 2: 100}), {1: 7, 2: 3})
+        # Largest remainder rounding still adds up
+        self.assertEqual(sum(allocate(10, {1: 1, 2: 1, 3: 1}, {1: 9, 2: 9, 3: 9}).values()), 10)
+
+    def test_small_pools_give_their_share_to_the_others(self):
+        self.assertEqual(allocate(10, {1: 70, 2: 30}, {1: 2, 2: 100}), {1: 2, 2: 8})
+        self.assertEqual(allocate(10, {1: 1, 2: 1}, {1: 3, 2: 0}), {1: 3, 2: 0})
+
+
+class InterleaveTests(TestCase):
+    def test_smooth_order(self):
+        self.assertEqual(interleave({1: 7, 2: 3}, {1: 70, 2: 30}), [1, 2, 1, 1, 1, 2, 1, 1, 2, 1])
+        self.assertEqual(interleave({1: 1, 2: 4}, {1: 50, 2: 50}), [1, 2, 2, 2, 2])
+
+
+class IdPoolTests(TestCase):
+    def test_round_trip(self):
+        ids = [uuid.uuid4() for _ in range(5)]
+        pool = IdPool(ids)
+        self.assertEqual(len(pool), 5)
+        self.assertEqual(len(pool.data), 80)
+        self.assertEqual([pool[i] for i in range(5)], ids)
+        self.assertEqual(sorted(pool.sample(5)), sorted(ids))
+        with self.assertRaises(IndexError):
+            pool[5]
+
+
+class CardPoolsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.german = CardGroup.objects.create(name='German')
+        cls.spanish = CardGroup.objects.create(name='Spanish')
+        for group, count in ((cls.german, 20), (cls.spanish, 5)):
+            Card.objects.bulk_create([
+                Card(name=f'{group.name} {i}', description=str(i), group=group) for i in range(count)
+            ])
+
+    def test_sample(self):
+        pools = CardPools()
+        ids = pools.sample({self.german.id: 50, self.spanish.id: 50}, 12)
+        self.assertEqual(len(set(ids)), 12)
+        groups = Counter(Card.objects.filter(uuid__in=ids).values_list('group_id', flat=True))
+        # Spanish runs out after 5, German makes up the rest
+        self.assertEqual(groups, {self.german.id: 7, self.spanish.id: 5})
+
+    def test_pool_size_is_capped(self):
+        pools = CardPools(max_pool=8)
+        self.assertEqual(len(pools.get(self.german.id)), 8)
+
+    def test_capped_pool_starts_at_a_random_uuid_and_wraps(self):
+        ordered = list(Card.objects.filter(group=self.german).order_by('uuid').values_list('uuid', flat=True))
+        with mock.patch('cards.mix.random.getrandbits', return_value=ordered[-3].int):
+            pool = CardPools(max_pool=8).load(self.german.id)
+        self.assertEqual([pool[i] for i in range(len(pool))], ordered[-3:] + ordered[:5])
+        with mock.patch('cards.mix.random.getrandbits', return_value=ordered[10].int):
+            pool = CardPools(max_pool=8).load(self.german.id)
+        self.assertEqual([pool[i] for i in range(len(pool))], ordered[10:18])
+
+    def test_endpoint_validation(self):
+        client = APIClient()
+        for params in ({'groups': '1:nan'}, {'groups': '1:inf'}, {'groups': '1', 'count': 'x'}, {}):
+            with self.subTest(params=params):
+                self.assertEqual(client.get('/api/cards/mix/', params).status_code, 400)
+        too_many = ','.join(str(group_id) for group_id in range(1, 34))
+        self.assertEqual(client.get('/api/cards/mix/', {'groups': too_many}).status_code, 400)
+        response = client.get('/api/cards/mix/', {'groups': self.german.id, 'count': -3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
@@ -0,0 +1,96 @@
+from unittest import skipUnless
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from cards import partitioning
+from cards.models import Card, CardGroup, CardStats
+
+
+class PartitionCardsCommandTests(SimpleTestCase):
+    @skipUnless(connection.vendor != 'postgresql', 'checks the error on other databases')
+    def test_needs_postgres(self):
+        with self.assertRaisesMessage(CommandError, 'Partitioning needs PostgreSQL'):
+            call_command('partition_cards')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'partitioning needs PostgreSQL')
+class PartitioningTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.groups = [CardGroup.objects.create(name=f'Group {i}') for i in range(3)]
+        for group in cls.groups:
+            Card.objects.bulk_create([
+                Card(name=f'{group.name} {i}', description=str(i), group=group) for i in range(10)
+            ])
+        Card.objects.create(name='No group', description='none')
+
+    def setUp(self):
+        # Deferred foreign key checks would leave trigger events pending on the
+        # card table, and Postgres refuses to alter a table that has them
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+    def copied_uuids(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT uuid FROM {partitioning.NEW_TABLE}')
+            return {row[0] for row in cursor.fetchall()}
+
+    def test_prepare_copy_mirror_and_swap(self):
+        partitioning.prepare('hash', 4)
+        with connection.cursor() as cursor:
+            self.assertTrue(partitioning.is_partitioned(cursor, partitioning.NEW_TABLE))
+
+        copied, finished = partitioning.copy_batch(10)
+        self.assertEqual((copied, finished), (10, False))
+        with self.assertRaises(partitioning.PartitioningError):
+            partitioning.swap()
+
+        # Writes to copied rows are mirrored, writes past the watermark are left to the copy
+        ordered = list(Card.objects.order_by('uuid'))
+        copied_card, pending_card = ordered[0], ordered[-1]
+        Card.objects.filter(uuid=copied_card.uuid).update(name='Renamed')
+        Card.objects.filter(uuid=ordered[1].uuid).delete()
+        pending_card.name = 'Renamed later'
+        pending_card.save()
+        self.assertEqual(len(self.copied_uuids()), 9)
+
+        self.assertEqual(partitioning.copy(batch_size=7), 21)
+        # Once finished, every write is mirrored
+        new_card = Card.objects.create(name='New', description='new', group=self.groups[0])
+        self.assertIn(new_card.uuid, self.copied_uuids())
+        self.assertEqual(partitioning.verify_copy(), 31)
+
+        partitioning.swap()
+        with connection.cursor() as cursor:
+            self.assertTrue(partitioning.is_partitioned(cursor))
+            self.assertEqual(len(partitioning.list_partitions(cursor)), 4)
+            self.assertTrue(partitioning.table_exists(cursor, partitioning.OLD_TABLE))
+            self.assertFalse(partitioning.table_exists(cursor, partitioning.PROGRESS_TABLE))
+
+        self.assertEqual(Card.objects.count(), 31)
+        self.assertEqual(Card.objects.get(uuid=copied_card.uuid).name, 'Renamed')
+        self.assertEqual(Card.objects.get(uuid=pending_card.uuid).name, 'Renamed later')
+        self.assertFalse(Card.objects.filter(uuid=ordered[1].uuid).exists())
+
+        # Deletes still cascade without database foreign keys
+        CardStats.objects.create(card=new_card, flips=1)
+        new_card.delete()
+        self.assertFalse(CardStats.objects.exists())
+
+    def test_status_strategy(self):
+        partitioning.prepare('status')
+        partitioning.copy()
+        partitioning.swap()
+        with connection.cursor() as cursor:
+            names = [name for name, *_ in partitioning.list_partitions(cursor)]
+        self.assertIn(f'{partitioning.TABLE}_draft', names)
+        self.assertEqual(Card.objects.count(), 31)
+
+    def test_invalid_options(self):
+        with connection.cursor() as cursor:
+            with self.assertRaises(partitioning.PartitioningError):
+                partitioning.prepare_statements(cursor, 'range', 4)
+            with self.assertRaises(partitioning.PartitioningError):
+                partitioning.prepare_statements(cursor, 'hash', 1)
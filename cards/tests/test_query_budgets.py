@@ -0,0 +1,315 @@
+"""
+Query-budget regression tests.
+
+Every endpoint gets an exact SQL query budget, checked against a seeded
+dataset and again after the dataset has grown, so N+1 queries show up as
+failures. Key lookups are also checked to use an index (EXPLAIN with
+sequential scans disabled on Postgres, EXPLAIN QUERY PLAN on SQLite).
+
+Run with ``python manage.py test cards`` against Postgres, or with
+``DB_ENGINE=sqlite`` for a local SQLite database.
+"""
+
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cards import archive
+from cards.mix import card_pools
+from cards.models import ArchivedCard, Card, CardGroup, CardStats, GroupStats, ImportJob, ReviewEvent
+from cards.reviews import review_buffer
+from cards.suggest import suggestion_index
+
+MEDIA_ROOT = tempfile.mkdtemp()
+STATUS = Card.STATUS_CHOICES
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+    MEDIA_ROOT=MEDIA_ROOT,
+    DATABASE_REPLICAS=[],
+)
+class QueryBudgetTestCase(TestCase):
+    CARDS_PER_GROUP = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('learner', password='secret')
+        # Anonymous API writes are attributed to this user, see views.get_request_user
+        User.objects.create_user('api_user')
+        cls.groups = [CardGroup.objects.create(name=name) for name in ('German', 'Spanish', 'French')]
+        cls.group = cls.groups[0]
+        for group in cls.groups:
+            cls.add_cards(group, cls.CARDS_PER_GROUP)
+        cls.card = Card.objects.filter(group=cls.group).first()
+        CardStats.objects.create(card=cls.card, flips=3, correct=1, incorrect=2, difficulty=0.6)
+        GroupStats.objects.create(group=cls.group, reviewed_cards=1, flips=3, correct=1, incorrect=2)
+        for group in cls.groups:
+            ImportJob.objects.create(file=f'imports/{group.name}.csv', group=group, user=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def add_cards(cls, group, count):
+        start = Card.objects.filter(group=group).count()
+        Card.objects.bulk_create([
+            Card(
+                name=f'{group.name} word {i}',
+                name_key=f'{group.name.lower()} word {i}',
+                description=f'Meaning {i}',
+                group=group,
+                user=cls.user,
+                status=STATUS.PUBLISHED if i % 3 else STATUS.DRAFT,
+            )
+            for i in range(start, start + count)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        suggestion_index.clear()
+        card_pools.clear()
+
+    def assertBudget(self, budget, method, url, data=None, status=200, **kwargs):
+        """Exactly ``budget`` queries, and the same again after every group gains 30 cards"""
+        for grow in (False, True):
+            if grow:
+                for group in self.groups:
+                    self.add_cards(group, 30)
+                suggestion_index.clear()
+                card_pools.clear()
+            with self.assertNumQueries(budget):
+                response = getattr(self.client, method)(url, data, **kwargs)
+            self.assertEqual(response.status_code, status, getattr(response, 'data', response))
+        return response
+
+    def assertUsesIndex(self, queryset):
+        """The query must be answerable without a full table scan"""
+        if connection.vendor == 'postgresql':
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = queryset.explain()
+            self.assertNotIn('Seq Scan', plan)
+        elif connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            self.assertIsNone(re.search(r'\bSCAN \w+\s*$', plan, re.MULTILINE), plan)
+
+
+class WebViewQueryTests(QueryBudgetTestCase):
+    def test_home(self):
+        self.assertBudget(1, 'get', '/')
+
+    def test_random_card_in_group(self):
+        self.assertBudget(2, 'get', '/german/')
+
+
+class CardGroupQueryTests(QueryBudgetTestCase):
+    def test_list(self):
+        self.assertBudget(2, 'get', '/api/groups/')
+
+    def test_filter_by_name(self):
+        response = self.assertBudget(2, 'get', '/api/groups/', {'name__iexact': 'GERMAN'})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_retrieve(self):
+        self.assertBudget(1, 'get', f'/api/groups/{self.group.id}/')
+
+    def test_create(self):
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/groups/', {'name': 'Italian'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_update(self):
+        self.assertBudget(3, 'patch', f'/api/groups/{self.group.id}/', {'name': 'Deutsch'}, format='json')
+
+    def test_destroy(self):
+        group = CardGroup.objects.create(name='Empty')
+        with self.assertNumQueries(6):
+            response = self.client.delete(f'/api/groups/{group.id}/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_get_or_create_existing(self):
+        self.assertBudget(1, 'post', '/api/groups/get_or_create/', {'name': 'german'}, format='json')
+
+    def test_get_or_create_new(self):
+        with self.assertNumQueries(4):
+            response = self.client.post('/api/groups/get_or_create/', {'name': 'Dutch'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_cards(self):
+        self.assertBudget(2, 'get', f'/api/groups/{self.group.id}/cards/')
+
+    def test_stats(self):
+        self.assertBudget(3, 'get', f'/api/groups/{self.group.id}/stats/')
+
+
+class CardQueryTests(QueryBudgetTestCase):
+    def test_list(self):
+        self.assertBudget(2, 'get', '/api/cards/')
+
+    def test_list_sparse_fields(self):
+        self.assertBudget(2, 'get', '/api/cards/', {'fields': 'uuid,name,group_name'})
+
+    def test_list_filtered(self):
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assertBudget(2, 'get', '/api/cards/', {
+            'status': 'published', 'group': self.group.id, 'user': self.user.id, 'updated_since': since,
+        })
+
+    def test_retrieve(self):
+        self.assertBudget(1, 'get', f'/api/cards/{self.card.uuid}/')
+
+    def test_create(self):
+        data = {'name': 'der Hund', 'group': self.group.id, 'description': 'dog', 'status': 'published'}
+        self.assertBudget(3, 'post', '/api/cards/', data, status=201, format='json')
+
+    def test_create_rejecting_duplicates(self):
+        data = {'name': 'Hund', 'group': self.group.id, 'description': 'dog'}
+        with self.assertNumQueries(4):
+            response = self.client.post('/api/cards/?reject_duplicates=true', data, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_update(self):
+        self.assertBudget(2, 'patch', f'/api/cards/{self.card.uuid}/', {'status': 'archived'}, format='json')
+
+    def test_destroy(self):
+        with self.assertNumQueries(4):
+            response = self.client.delete(f'/api/cards/{self.card.uuid}/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_by_group(self):
+        self.assertBudget(1, 'get', '/api/cards/by_group/', {'group_id': self.group.id})
+
+    def test_random(self):
+        self.assertBudget(1, 'get', '/api/cards/random/', {'group_id': self.group.id})
+
+    def test_search(self):
+        self.assertBudget(1, 'get', '/api/cards/search/', {'q': 'word 1'})
+
+    def test_suggest(self):
+        # Cold: one query builds the prefix index; warm: served from memory
+        self.assertBudget(1, 'get', '/api/cards/suggest/', {'prefix': 'germ', 'group_id': self.group.id})
+        with self.assertNumQueries(0):
+            self.client.get('/api/cards/suggest/', {'prefix': 'germ', 'group_id': self.group.id})
+
+    def test_mix(self):
+        weights = f'{self.groups[0].id}:70,{self.groups[1].id}:30'
+        # Two queries per cold pool (from a random uuid, then the wrap-around) and the cards
+        response = self.assertBudget(5, 'get', '/api/cards/mix/', {'groups': weights, 'count': 10})
+        self.assertEqual(len(response.data), 10)
+
+    def test_stats(self):
+        self.assertBudget(2, 'get', f'/api/cards/{self.card.uuid}/stats/')
+
+
+class ReviewAndImportQueryTests(QueryBudgetTestCase):
+    def test_post_review_events(self):
+        cards = Card.objects.filter(group=self.group)[:10]
+        events = [{'card': str(card.uuid), 'event': 'flip'} for card in cards]
+        self.addCleanup(review_buffer.flush)
+        self.assertBudget(1, 'post', '/api/reviews/', {'events': events}, status=202, format='json')
+        # Both requests' events go out in a single insert, after one card lookup
+        with self.assertNumQueries(2):
+            self.assertEqual(review_buffer.flush(), 20)
+
+    def test_create_import_job(self):
+        upload = SimpleUploadedFile('words.csv', b'German Word,English Translation\nHund,dog\n')
+        with self.assertNumQueries(3):
+            response = self.client.post('/api/imports/', {'file': upload, 'group': self.group.id})
+        self.assertEqual(response.status_code, 201)
+
+    def test_list_import_jobs(self):
+        self.assertBudget(2, 'get', '/api/imports/')
+
+
+class IndexUsageTests(QueryBudgetTestCase):
+    def test_cards_by_group(self):
+        self.assertUsesIndex(Card.objects.filter(group=self.group))
+
+    def test_cards_by_group_and_status(self):
+        self.assertUsesIndex(Card.objects.filter(group=self.group, status=STATUS.PUBLISHED))
+
+    def test_cards_updated_since(self):
+        self.assertUsesIndex(Card.objects.filter(updated_at__gte=timezone.now()))
+
+    def test_card_by_uuid(self):
+        self.assertUsesIndex(Card.objects.filter(uuid=self.card.uuid))
+
+    def test_duplicate_check(self):
+        self.assertUsesIndex(Card.objects.filter(group=self.group, name_key='hund'))
+
+    def test_group_by_name(self):
+        self.assertUsesIndex(CardGroup.objects.by_name('german'))
+
+
+class ArchiveTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cold = list(Card.objects.filter(group=self.group).values_list('uuid', flat=True)[:5])
+        # update() leaves updated_at alone, as if the cards were archived long ago
+        Card.objects.filter(uuid__in=self.cold).update(
+            status=STATUS.ARCHIVED, updated_at=timezone.now() - timedelta(days=365),
+        )
+        if self.card.uuid not in self.cold:
+            self.cold[0] = self.card.uuid
+            Card.objects.filter(uuid=self.card.uuid).update(
+                status=STATUS.ARCHIVED, updated_at=timezone.now() - timedelta(days=365),
+            )
+
+    def test_archive_moves_cards_out_of_card_table(self):
+        total = Card.objects.count()
+        moved, _ = archive.archive()
+        self.assertEqual(moved, 5)
+        self.assertEqual(Card.objects.count(), total - 5)
+        self.assertEqual(ArchivedCard.objects.count(), 5)
+        self.assertFalse(CardStats.objects.filter(card_id=self.card.uuid).exists())
+
+    def test_cards_with_events_not_rolled_up_stay(self):
+        ReviewEvent.objects.create(card_id=self.card.uuid, event='flip')
+        moved, _ = archive.archive()
+        self.assertEqual(moved, 4)
+        self.assertTrue(Card.objects.filter(uuid=self.card.uuid).exists())
+
+    def test_retrieve_restores_card(self):
+        created_at = self.card.created_at
+        archive.archive()
+        # Miss, restore in one transaction, then the normal lookup
+        with self.assertNumQueries(9):
+            response = self.client.get(f'/api/cards/{self.card.uuid}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'archived')
+        card = Card.objects.get(uuid=self.card.uuid)
+        self.assertEqual(card.created_at, created_at)
+        self.assertEqual(card.name_key, self.card.name_key)
+        self.assertEqual(CardStats.objects.get(card=card).flips, 3)
+        self.assertFalse(ArchivedCard.objects.filter(uuid=self.card.uuid).exists())
+
+    def test_patch_unarchives_cold_card(self):
+        archive.archive()
+        response = self.client.patch(f'/api/cards/{self.cold[1]}/', {'status': 'published'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Card.objects.get(uuid=self.cold[1]).status, STATUS.PUBLISHED)
+        self.assertEqual(ArchivedCard.objects.count(), 4)
+
+    def test_unknown_card_is_still_404(self):
+        archive.archive()
+        self.assertEqual(self.client.get('/api/cards/00000000-0000-0000-0000-000000000000/').status_code, 404)
+        self.assertEqual(self.client.get('/api/cards/not-a-uuid/').status_code, 404)
+
+    def test_restore_all(self):
+        archive.archive()
+        self.assertEqual(archive.restore_all(group_id=self.group.id, batch_size=2), 5)
+        self.assertFalse(ArchivedCard.objects.exists())
+        self.assertEqual(Card.objects.filter(uuid__in=self.cold).count(), 5)
+
@@ -0,0 +1,91 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cards.models import Card, CardGroup, CardStats, GroupStats, ReviewEvent, ReviewRollup
+from cards.reviews import ReviewEventBuffer, difficulty, rollup
+
+
+class ReviewEventBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.card = Card.objects.create(name='Hund', description='dog')
+
+    def events(self, count):
+        return [ReviewEvent(card=self.card, event='flip') for _ in range(count)]
+
+    def test_flushes_when_full(self):
+        buffer = ReviewEventBuffer(max_size=3, max_age=60)
+        self.addCleanup(buffer.flush)
+        buffer.add(self.events(2))
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(ReviewEvent.objects.count(), 0)
+        buffer.add(self.events(1))
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(ReviewEvent.objects.count(), 3)
+
+    def test_flush(self):
+        buffer = ReviewEventBuffer(max_size=10, max_age=60)
+        buffer.add(self.events(4))
+        self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(ReviewEvent.objects.count(), 4)
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = CardGroup.objects.create(name='German')
+        cls.hund = Card.objects.create(name='Hund', description='dog', group=cls.group)
+        cls.katze = Card.objects.create(name='Katze', description='cat', group=cls.group)
+
+    def record(self, card, *events):
+        ReviewEvent.objects.bulk_create([ReviewEvent(card=card, event=event) for event in events])
+
+    def test_difficulty(self):
+        self.assertEqual(difficulty(0, 0), 0.5)
+        self.assertEqual(difficulty(3, 1), 2 / 6)
+
+    def test_rollup_arithmetic(self):
+        self.record(self.hund, 'flip', 'flip', 'correct', 'incorrect', 'incorrect')
+        self.record(self.katze, 'correct')
+        self.assertEqual(rollup(batch_size=2, delay=0), 6)
+
+        hund = CardStats.objects.get(card=self.hund)
+        self.assertEqual((hund.flips, hund.correct, hund.incorrect), (2, 1, 2))
+        self.assertEqual(hund.difficulty, difficulty(1, 2))
+        group = GroupStats.objects.get(group=self.group)
+        self.assertEqual((group.reviewed_cards, group.flips, group.correct, group.incorrect), (2, 2, 2, 2))
+        watermark = ReviewRollup.objects.get()
+        self.assertEqual(watermark.last_event_id, ReviewEvent.objects.latest('id').id)
+        self.assertEqual(watermark.events, 6)
+
+        # A second run only adds the new events
+        self.assertEqual(rollup(delay=0), 0)
+        self.record(self.hund, 'correct')
+        self.assertEqual(rollup(delay=0), 1)
+        hund.refresh_from_db()
+        self.assertEqual((hund.flips, hund.correct, hund.incorrect), (2, 2, 2))
+        self.assertEqual(ReviewRollup.objects.get().events, 7)
+
+    def test_recent_events_wait_for_the_next_run(self):
+        self.record(self.hund, 'correct')
+        self.assertEqual(rollup(delay=60), 0)
+        with mock.patch('cards.reviews.timezone.now', return_value=timezone.now() + timedelta(seconds=61)):
+            self.assertEqual(rollup(delay=60), 1)
+
+
+class StatsEndpointTests(TestCase):
+    def test_malformed_ids_are_not_found(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/cards/not-a-uuid/stats/').status_code, 404)
+        self.assertEqual(client.get('/api/groups/abc/stats/').status_code, 404)
+
+    def test_card_without_reviews(self):
+        card = Card.objects.create(name='Hund', description='dog')
+        response = APIClient().get(f'/api/cards/{card.uuid}/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['difficulty'], 0.5)
@@ -0,0 +1,66 @@
+import msgpack
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from cards.models import Card, CardGroup
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = CardGroup.objects.create(name='German')
+        cls.card = Card.objects.create(name='Hund', description='dog', group=cls.group)
+
+    def test_only_requested_fields_are_returned_and_selected(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get('/api/cards/', {'fields': 'uuid, name,group_name'})
+        self.assertEqual(response.data['results'], [
+            {'uuid': str(self.card.uuid), 'name': 'Hund', 'group_name': 'German'},
+        ])
+        select = queries[-1]['sql']
+        self.assertIn('"cards_cardgroup"."name"', select)
+        self.assertNotIn('"cards_card"."description"', select)
+        self.assertNotIn('"cards_cardgroup"."image"', select)
+
+    def test_without_relations_nothing_is_joined(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get(f'/api/cards/{self.card.uuid}/', {'fields': 'name'})
+        self.assertEqual(response.data, {'name': 'Hund'})
+        self.assertNotIn('JOIN', queries[-1]['sql'])
+
+    def test_unknown_fields_are_ignored(self):
+        response = APIClient().get('/api/groups/', {'fields': 'name,nope'})
+        self.assertEqual(response.data['results'], [{'name': 'German'}])
+
+    def test_only_unknown_fields_is_a_bad_request(self):
+        for url in ('/api/groups/', f'/api/cards/{self.card.uuid}/', f'/api/groups/{self.group.id}/cards/'):
+            with self.subTest(url=url):
+                response = APIClient().get(url, {'fields': 'bogus, nope'})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('name', str(response.data['fields']))
+
+    def test_writes_return_every_field(self):
+        response = APIClient().patch(
+            f'/api/groups/{self.group.id}/?fields=name', {'name': 'Deutsch'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('created_at', response.data)
+
+
+class MessagePackRendererTests(TestCase):
+    def test_msgpack_response(self):
+        group = CardGroup.objects.create(name='German')
+        response = APIClient().get('/api/groups/', {'fields': 'id,name'}, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(data['results'], [{'id': group.id, 'name': 'German'}])
+
+    def test_format_query_parameter(self):
+        card = Card.objects.create(name='Hund', description='dog')
+        response = APIClient().get(f'/api/cards/{card.uuid}/', {'format': 'msgpack'})
+        data = msgpack.unpackb(response.content)
+        # UUIDs and datetimes are encoded as strings, like the JSON renderer does
+        self.assertEqual(data['uuid'], str(card.uuid))
+        self.assertIsInstance(data['created_at'], str)
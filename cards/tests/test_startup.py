@@ -0,0 +1,66 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+# Loads the app in a fresh interpreter, optionally runs gunicorn's preload
+# hook, and reports which of the heavy optional modules got imported
+PROBE = r'''
+import json, os, runpy, sys
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+if sys.argv[1] == 'preload':
+    runpy.run_path('gunicorn.conf.py')['when_ready'](None)
+print(json.dumps({module: module in sys.modules for module in ('boto3', 'PIL.Image', 'msgpack')}))
+'''
+
+S3_ENV = {
+    'AWS_ACCESS_KEY_ID': 'key',
+    'AWS_SECRET_ACCESS_KEY': 'secret',
+    'AWS_STORAGE_BUCKET_NAME': 'bucket',
+}
+
+
+class StartupImportTests(SimpleTestCase):
+    def probe(self, mode, **env):
+        environ = {
+            key: value for key, value in os.environ.items() if key not in S3_ENV
+        }
+        environ.update(DJANGO_SETTINGS_MODULE='flashcards.settings', DB_ENGINE='sqlite', **env)
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, mode],
+            cwd=settings.BASE_DIR, env=environ, capture_output=True, text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_heavy_modules_are_not_imported_by_the_app(self):
+        imported = self.probe('app', **S3_ENV)
+        self.assertEqual(imported, {'boto3': False, 'PIL.Image': False, 'msgpack': False})
+
+    def test_preload_skips_s3_unless_configured(self):
+        self.assertFalse(self.probe('preload')['boto3'])
+        try:
+            import storages.backends.s3boto3  # noqa: F401
+        except ImportError:
+            self.skipTest('django-storages is not installed')
+        self.assertTrue(self.probe('preload', **S3_ENV)['boto3'])
+
+
+class ProfileStartupTests(SimpleTestCase):
+    def test_report_and_budget(self):
+        out = io.StringIO()
+        call_command('profile_startup', '--json', '--top', '3', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual([step['step'] for step in report['steps'][:3]],
+                         ['interpreter', 'wsgi application', 'url conf and views'])
+        self.assertEqual(len(report['imports']), 3)
+        with self.assertRaisesMessage(CommandError, 'over the 0 ms budget'):
+            call_command('profile_startup', '--max-ms', '0.001', stdout=io.StringIO())
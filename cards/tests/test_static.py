@@ -0,0 +1,24 @@
+import os
+import re
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+
+class HashedStaticFilesTests(TestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root, ignore_errors=True)
+
+    def test_pages_reference_hashed_compressed_assets(self):
+        with override_settings(STATIC_ROOT=self.static_root, DEBUG=False):
+            # Only the project's own assets; the admin and DRF ones make this slow
+            call_command('collectstatic', interactive=False, verbosity=0,
+                         ignore_patterns=['admin', 'rest_framework'])
+            response = self.client.get('/')
+
+        match = re.search(r'/static/(style\.[0-9a-f]{12}\.css)', response.content.decode())
+        self.assertIsNotNone(match, 'home page should link the hashed stylesheet')
+        self.assertTrue(os.path.exists(os.path.join(self.static_root, match.group(1) + '.gz')))
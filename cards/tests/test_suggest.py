@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from cards import suggest
+from cards.models import Card, CardGroup
+from cards.suggest import PrefixIndex, SuggestionIndex, suggestion_index
+
+
+class PrefixIndexTests(TestCase):
+    def test_lookup_is_case_insensitive_sorted_and_limited(self):
+        index = PrefixIndex((name.casefold(), name, str(i)) for i, name in enumerate(
+            ['Hund', 'haus', 'Hase', 'Katze', 'Hausboot']
+        ))
+        self.assertEqual([r['name'] for r in index.lookup('HA', 10)], ['Hase', 'haus', 'Hausboot'])
+        self.assertEqual([r['name'] for r in index.lookup('ha', 2)], ['Hase', 'haus'])
+        self.assertEqual(index.lookup('z', 10), [])
+
+
+class SuggestionIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('learner')
+        cls.group = CardGroup.objects.create(name='German')
+        for name in ('Apfel', 'Ameise', 'Auto', 'Birne', 'Baum'):
+            Card.objects.create(name=name, description=name, group=cls.group, user=cls.user)
+
+    def test_suggest_by_group(self):
+        index = SuggestionIndex()
+        names = [r['name'] for r in index.suggest('a', self.group.id)]
+        self.assertEqual(names, ['Ameise', 'Apfel', 'Auto'])
+        self.assertEqual(index.suggest('a', self.group.id + 1), [])
+        self.assertEqual(index.suggest('', self.group.id), [])
+
+    def test_writes_invalidate_loaded_indexes(self):
+        index = SuggestionIndex()
+        self.assertEqual(len(index.suggest('b', self.group.id)), 2)
+        card = Card.objects.create(name='Brot', description='bread', group=self.group)
+        self.assertEqual(len(index.suggest('b', self.group.id)), 3)
+        card.delete()
+        self.assertEqual(len(index.suggest('b', self.group.id)), 2)
+
+    def test_version_bump_from_another_process_invalidates(self):
+        index = SuggestionIndex()
+        index.suggest('b', self.group.id)
+        # bulk writes (imports, archiving) skip signals and bump the version directly
+        Card.objects.bulk_create([Card(name='Brot', description='bread', group=self.group)])
+        self.assertEqual(len(index.suggest('b', self.group.id)), 2)
+        suggest.bump_version([self.group.id])
+        self.assertEqual(len(index.suggest('b', self.group.id)), 3)
+
+    def test_writes_only_invalidate_their_groups(self):
+        other = CardGroup.objects.create(name='Spanish')
+        index = SuggestionIndex()
+        index.suggest('b', self.group.id)
+        index.suggest('b')
+        Card.objects.create(name='Burro', description='donkey', group=other)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(index.suggest('b', self.group.id)), 2)
+        # The index over all cards includes every group
+        self.assertEqual(len(index.suggest('b')), 3)
+
+    def test_moving_a_card_invalidates_both_groups(self):
+        other = CardGroup.objects.create(name='Spanish')
+        index = SuggestionIndex()
+        self.assertEqual(len(index.suggest('b', self.group.id)), 2)
+        self.assertEqual(index.suggest('b', other.id), [])
+        card = Card.objects.get(name='Baum')
+        card.group = other
+        card.save()
+        self.assertEqual([r['name'] for r in index.suggest('b', self.group.id)], ['Birne'])
+        self.assertEqual([r['name'] for r in index.suggest('b', other.id)], ['Baum'])
+
+    def test_groups_over_the_limit_are_queried_not_truncated(self):
+        index = SuggestionIndex(max_names=3)
+        with self.assertNumQueries(2):
+            names = [r['name'] for r in index.suggest('b', self.group.id)]
+        self.assertEqual(names, ['Baum', 'Birne'])
+        # The group is remembered as too large, only the query runs again
+        with self.assertNumQueries(1):
+            self.assertEqual([r['name'] for r in index.suggest('Au', self.group.id)], ['Auto'])
+
+    def test_lru_eviction(self):
+        other = CardGroup.objects.create(name='Spanish')
+        index = SuggestionIndex(max_groups=1)
+        index.suggest('a', self.group.id)
+        index.suggest('a', other.id)
+        self.assertEqual(list(index._indexes), [other.id])
+
+    def test_endpoint(self):
+        response = APIClient().get('/api/cards/suggest/', {'prefix': 'ap', 'group_id': self.group.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['name'] for r in response.data], ['Apfel'])
+        response = APIClient().get('/api/cards/suggest/', {'prefix': 'ap', 'group_id': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_endpoint_clamps_limit(self):
+        self.addCleanup(suggestion_index.clear)
+        params = {'prefix': 'a', 'group_id': self.group.id, 'limit': -5}
+        for max_names in (50000, 3):
+            # Indexed, then too large to index and served by the query
+            suggestion_index.clear()
+            with self.subTest(max_names=max_names), mock.patch.object(suggestion_index, 'max_names', max_names):
+                response = APIClient().get('/api/cards/suggest/', params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([r['name'] for r in response.data], ['Ameise'])
@@ -6,6 +6,8 @@ from . import views
 router = DefaultRouter()
 router.register(r'cards', views.CardViewSet, basename='card')
 router.register(r'groups', views.CardGroupViewSet, basename='cardgroup')
+router.register(r'reviews', views.ReviewEventViewSet, basename='review')
+router.register(r'imports', views.ImportJobViewSet, basename='importjob')
 
 urlpatterns = [
     # Web views
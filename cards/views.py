@@ -1,16 +1,29 @@
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
 
-from .models import Card, CardGroup
-from .serializers import CardSerializer, CardGroupSerializer, CardCreateSerializer
+from . import archive
+from .dedup import normalize_name
+from .mix import card_pools, parse_weights
+from .models import Card, CardGroup, CardStats, GroupStats, ImportJob, ReviewEvent
+from .reviews import resolve_cards, review_buffer
+from .serializers import (
+    CardSerializer, CardGroupSerializer, CardCreateSerializer,
+    ReviewEventSerializer, CardStatsSerializer, GroupStatsSerializer,
+    ImportJobSerializer, requested_fields,
+)
+from .suggest import suggestion_index
 
 
 def get_random_card(request, group):
     # Get the CardGroup object by name (case-insensitive)
-    card_group = get_object_or_404(CardGroup, name__iexact=group)
+    card_group = get_object_or_404(CardGroup.objects.by_name(group))
     # Get a random card from the group
     card = Card.objects.filter(group=card_group).order_by('?').first()
     return render(request, 'card.html', {'card': card})
@@ -20,6 +33,47 @@ def home(request):
     return render(request, 'home.html', {'card_groups': card_groups})
 
 
+def get_request_user(request):
+    """The authenticated user, or a shared default user for anonymous API access"""
+    if request.user.is_authenticated:
+        return request.user
+
+    # For unauthenticated API access, try to get or create a default user
+    from django.contrib.auth.models import User
+    user, created = User.objects.get_or_create(
+        username='api_user',
+        defaults={
+            'email': 'api@flashcards.local',
+            'first_name': 'API',
+            'last_name': 'User'
+        }
+    )
+    return user
+
+
+def project_queryset(queryset, serializer_class, request):
+    """
+    Narrow the SELECT to the columns behind the fields requested with ?fields=,
+    joining only the relations those fields read from.
+    """
+    fields = requested_fields(request)
+    if not fields:
+        return queryset
+
+    only = {queryset.model._meta.pk.name}
+    related = set()
+    for name, field in serializer_class().fields.items():
+        if name not in fields:
+            continue
+        if field.source == '*':
+            return queryset
+        source = field.source.replace('.', '__')
+        if '__' in source:
+            related.add(source.rsplit('__', 1)[0])
+        only.add(source)
+    return queryset.select_related(None).select_related(*related).only(*only)
+
+
 # API Views
 class CardGroupViewSet(viewsets.ModelViewSet):
     """
@@ -29,48 +83,137 @@ class CardGroupViewSet(viewsets.ModelViewSet):
     queryset = CardGroup.objects.all()
     serializer_class = CardGroupSerializer
 
+    def get_queryset(self):
+        return project_queryset(super().get_queryset(), self.get_serializer_class(), self.request)
+
+    def filter_queryset(self, queryset):
+        """Filter by ?name= (exact) or ?name__iexact= (any case, uses the lower(name) index)"""
+        queryset = super().filter_queryset(queryset)
+        params = self.request.query_params
+        if 'name' in params:
+            queryset = queryset.filter(name=params['name'])
+        if 'name__iexact' in params:
+            queryset = queryset.by_name(params['name__iexact'])
+        return queryset
+
+    @action(detail=False, methods=['post'])
+    def get_or_create(self, request):
+        """Get a group by name (case-insensitive), creating it if it does not exist"""
+        name = str(request.data.get('name', '')).strip()
+        if not name:
+            return Response(
+                {'error': 'name is required'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            # Field checks only (length); an existing group is what we want here
+            name = self.get_serializer().fields['name'].run_validation(name)
+        except ValidationError as exc:
+            raise ValidationError({'name': exc.detail})
+
+        group, created = CardGroup.objects.get_or_create_by_name(name)
+        serializer = self.get_serializer(group)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
     @action(detail=True, methods=['get'])
     def cards(self, request, pk=None):
         """Get all cards in a specific group"""
         group = self.get_object()
-        cards = Card.objects.filter(group=group)
+        cards = project_queryset(
+            Card.objects.select_related('group', 'user').filter(group=group),
+            CardSerializer,
+            request,
+        )
         serializer = CardSerializer(cards, many=True, context={'request': request})
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Review statistics for a group and its hardest cards"""
+        group = self.get_object()
+        group_stats = GroupStats.objects.filter(group=group).first() or GroupStats(group=group)
+        hardest = (
+            CardStats.objects.filter(card__group=group)
+            .order_by('-difficulty')[:10]
+        )
+        data = GroupStatsSerializer(group_stats).data
+        data['hardest_cards'] = CardStatsSerializer(hardest, many=True).data
+        return Response(data)
+
 
 class CardViewSet(viewsets.ModelViewSet):
     """
     API endpoint for managing cards.
     Provides CRUD operations for cards.
     """
-    queryset = Card.objects.all()
+    queryset = Card.objects.select_related('group', 'user')
     serializer_class = CardSerializer
 
+    def get_queryset(self):
+        return project_queryset(super().get_queryset(), self.get_serializer_class(), self.request)
+
+    def filter_queryset(self, queryset):
+        """
+        Filter by ?status=, ?user=, ?group=, ?updated_since= (ISO 8601) and
+        ?duplicates_of= (cards whose normalized name matches the given name)
+        """
+        queryset = super().filter_queryset(queryset)
+        params = self.request.query_params
+
+        if 'status' in params:
+            if params['status'] not in Card.STATUS_CHOICES.values:
+                raise ValidationError({'status': f'must be one of {", ".join(Card.STATUS_CHOICES.values)}'})
+            queryset = queryset.filter(status=params['status'])
+        for field in ('user', 'group'):
+            if field in params:
+                if not params[field].isdecimal():
+                    raise ValidationError({field: 'must be an integer id'})
+                queryset = queryset.filter(**{f'{field}_id': params[field]})
+        if 'updated_since' in params:
+            try:
+                updated_since = parse_datetime(params['updated_since'])
+            except ValueError:
+                # Well formed but impossible, e.g. February 30th
+                updated_since = None
+            if updated_since is None:
+                raise ValidationError({'updated_since': 'must be an ISO 8601 datetime'})
+            if timezone.is_naive(updated_since):
+                updated_since = timezone.make_aware(updated_since)
+            queryset = queryset.filter(updated_at__gte=updated_since)
+        if 'duplicates_of' in params:
+            queryset = queryset.filter(name_key=normalize_name(params['duplicates_of'])[:255])
+        return queryset
+
+    def get_object(self):
+        """Restore the card from cold storage (see cards.archive) if it was moved there"""
+        try:
+            return super().get_object()
+        except Http404:
+            # Look again even if nothing was restored here: a concurrent
+            # request may have restored the card first
+            archive.restore([self.kwargs[self.lookup_url_kwarg or self.lookup_field]])
+        return super().get_object()
+
     def get_serializer_class(self):
         """Use different serializers for create vs other actions"""
         if self.action == 'create':
             return CardCreateSerializer
         return CardSerializer
 
+    def get_serializer_context(self):
+        """Let clients opt into the duplicate check with ?reject_duplicates=true"""
+        context = super().get_serializer_context()
+        context['reject_duplicates'] = (
+            self.request.query_params.get('reject_duplicates', '').lower() in ('1', 'true', 'yes')
+        )
+        return context
+
     def perform_create(self, serializer):
         """Automatically assign a user when creating a card via API"""
-        # Try to use the authenticated user, or get/create a default user for API access
-        user = None
-        if self.request.user.is_authenticated:
-            user = self.request.user
-        else:
-            # For unauthenticated API access, try to get or create a default user
-            from django.contrib.auth.models import User
-            user, created = User.objects.get_or_create(
-                username='api_user',
-                defaults={
-                    'email': 'api@flashcards.local',
-                    'first_name': 'API',
-                    'last_name': 'User'
-                }
-            )
-        
-        serializer.save(user=user)
+        serializer.save(user=get_request_user(self.request))
 
     @action(detail=False, methods=['get'])
     def by_group(self, request):
@@ -82,14 +225,14 @@ class CardViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        cards = Card.objects.filter(group_id=group_id)
+        cards = self.filter_queryset(self.get_queryset()).filter(group_id=group_id)
         serializer = self.get_serializer(cards, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def random(self, request):
         """Get a random card, optionally from a specific group"""
-        queryset = Card.objects.all()
+        queryset = self.filter_queryset(self.get_queryset())
         group_id = request.query_params.get('group_id')
         
         if group_id:
@@ -105,6 +248,38 @@ class CardViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(card)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def mix(self, request):
+        """Get an interleaved batch of random cards from several weighted groups"""
+        try:
+            weights = parse_weights(request.query_params.get('groups', ''))
+            count = max(1, min(int(request.query_params.get('count', 20)), 100))
+        except ValueError:
+            return Response(
+                {'error': 'groups must look like 1:70,2:30 and count must be an integer'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not weights:
+            return Response(
+                {'error': 'groups parameter is required'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(weights) > card_pools.max_groups:
+            return Response(
+                {'error': f'at most {card_pools.max_groups} groups can be mixed'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ids = card_pools.sample(weights, count)
+        cards = self.get_queryset().filter(group_id__in=weights).in_bulk(ids)
+        if len(cards) < len(ids):
+            # Cards were deleted or moved since the pools were loaded
+            for group_id in weights:
+                card_pools.invalidate(group_id)
+
+        serializer = self.get_serializer([cards[i] for i in ids if i in cards], many=True)
+        return Response(serializer.data)
+
     @action(detail=False, methods=['get'])
     def search(self, request):
         """Search cards by name or description"""
@@ -115,8 +290,104 @@ class CardViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        cards = Card.objects.filter(
+        cards = self.filter_queryset(self.get_queryset()).filter(
             Q(name__icontains=query) | Q(description__icontains=query)
         )
         serializer = self.get_serializer(cards, many=True)
         return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Type-ahead suggestions for card names starting with a prefix"""
+        prefix = request.query_params.get('prefix', '')
+        if not prefix:
+            return Response(
+                {'error': 'prefix parameter is required'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            group_id = request.query_params.get('group_id')
+            group_id = int(group_id) if group_id else None
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+        except ValueError:
+            return Response(
+                {'error': 'group_id and limit must be integers'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(suggestion_index.suggest(prefix, group_id, limit))
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Review statistics for a card, as of the last rollup"""
+        # Restores a cold card, whose stats come back with it
+        card = self.get_object()
+        card_stats = CardStats.objects.filter(card=card).first() or CardStats(card=card)
+        return Response(CardStatsSerializer(card_stats).data)
+
+
+class ReviewEventViewSet(viewsets.ViewSet):
+    """
+    API endpoint for logging study events (card flips and answers).
+    Events are buffered and written in batches; stats are updated by the
+    rollup_reviews management command.
+    """
+    MAX_BATCH = 1000
+
+    def create(self, request):
+        """Accept a batch of review events"""
+        data = request.data
+        if isinstance(data, dict):
+            data = data.get('events', [])
+        if not isinstance(data, list) or not data:
+            return Response(
+                {'error': 'a non-empty list of events is required'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(data) > self.MAX_BATCH:
+            return Response(
+                {'error': f'at most {self.MAX_BATCH} events per request'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = ReviewEventSerializer(data=data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        known = resolve_cards({event['card'] for event in serializer.validated_data})
+        user = request.user if request.user.is_authenticated else None
+        events = []
+        for event in serializer.validated_data:
+            if event['card'] not in known:
+                continue
+            review = ReviewEvent(
+                card_id=event['card'],
+                user=user,
+                event=event['event'],
+                response_ms=event.get('response_ms'),
+            )
+            if event.get('occurred_at'):
+                review.occurred_at = event['occurred_at']
+            events.append(review)
+
+        review_buffer.add(events)
+        return Response(
+            {'accepted': len(events), 'rejected': len(data) - len(events)},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class ImportJobViewSet(mixins.CreateModelMixin,
+                       mixins.ListModelMixin,
+                       mixins.RetrieveModelMixin,
+                       viewsets.GenericViewSet):
+    """
+    API endpoint for background CSV imports.
+    Uploaded files are queued and processed by the run_import_worker command;
+    poll a job to follow its progress.
+    """
+    queryset = ImportJob.objects.select_related('group')
+    serializer_class = ImportJobSerializer
+
+    def perform_create(self, serializer):
+        serializer.save(user=get_request_user(self.request))
@@ -0,0 +1,120 @@
+"""
+Primary/replica database routing.
+
+Reads go to one of ``DATABASE_REPLICAS`` and writes go to ``default``. Reads
+stay on the primary for the rest of a request once it has written, inside
+transactions, for unsafe (POST/PUT/PATCH/DELETE) requests, and for
+``DATABASE_REPLICA_PIN_SECONDS`` after a write via a short-lived cookie, so a
+user always reads their own writes despite replication lag. A replica that
+fails to connect, or fails a query during a safe request, is skipped for
+``DATABASE_REPLICA_RETRY_SECONDS``; in the latter case the view is run again
+on the primary.
+
+Only requests are routed to replicas: outside ``ReplicaPinMiddleware``
+(management commands, the import worker, background threads) everything
+stays on the primary, since those read-modify-write state such as the
+review rollup watermark and cannot tolerate lag.
+"""
+
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+PIN_COOKIE = 'db_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_pinned = ContextVar('db_pinned_to_primary', default=True)
+_wrote = ContextVar('db_wrote_to_primary', default=False)
+_replicas_read = ContextVar('db_replicas_read', default=())
+_down_until = {}
+
+
+def mark_replica_down(alias):
+    _down_until[alias] = time.monotonic() + getattr(settings, 'DATABASE_REPLICA_RETRY_SECONDS', 30)
+
+
+def replica_is_healthy(alias):
+    if time.monotonic() < _down_until.get(alias, 0):
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except OperationalError:
+        mark_replica_down(alias)
+        return False
+    return True
+
+
+def choose_replica():
+    """A healthy replica alias, or the primary when none is available"""
+    replicas = [
+        alias for alias in getattr(settings, 'DATABASE_REPLICAS', [])
+        if replica_is_healthy(alias)
+    ]
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        alias = choose_replica()
+        if alias != DEFAULT_DB_ALIAS and alias not in _replicas_read.get():
+            _replicas_read.set((*_replicas_read.get(), alias))
+        return alias
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *getattr(settings, 'DATABASE_REPLICAS', [])}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPinMiddleware:
+    """Scopes routing state to the request and sets the read-your-writes cookie"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+        pinned_token = _pinned.set(pinned)
+        wrote_token = _wrote.set(False)
+        read_token = _replicas_read.set(())
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(
+                    PIN_COOKIE, '1',
+                    max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5),
+                    httponly=True,
+                    samesite='Lax',
+                )
+            return response
+        finally:
+            _pinned.reset(pinned_token)
+            _wrote.reset(wrote_token)
+            _replicas_read.reset(read_token)
+
+    def process_exception(self, request, exception):
+        """Run a safe request again on the primary when a replica failed mid-request"""
+        replicas = _replicas_read.get()
+        if not replicas or not isinstance(exception, OperationalError) or request.method not in SAFE_METHODS:
+            return None
+        for alias in replicas:
+            mark_replica_down(alias)
+            connections[alias].close()
+        _pinned.set(True)
+        _replicas_read.set(())
+        callback, args, kwargs = request.resolver_match
+        return callback(request, *args, **kwargs)
@@ -24,7 +24,11 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-3(xcqt3%#33!^b7_m3%h23*ve95ij)j=!b$cs4klm&ax2qp*$%'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Set DJANGO_DEBUG=false in production: with it on, {% static %} emits unhashed
+# URLs, which defeats the long-lived caching of the hashed files (see
+# STATICFILES_STORAGE). With it off, run collectstatic first and let nginx
+# serve /media/ (see nginx/nginx.conf).
+DEBUG = environ.get('DJANGO_DEBUG', 'true').lower() == 'true'
 
 ALLOWED_HOSTS = environ.get('ALLOWED_HOSTS', 'localhost,localhost:8009').split(',')
 CSRF_TRUSTED_ORIGINS = environ.get('CSRF_TRUSTED_ORIGINS', 'http://localhost:8009').split(',')
@@ -39,12 +43,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'storages',
     'rest_framework',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'flashcards.db_router.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -90,6 +94,54 @@ DATABASES = {
     }
 }
 
+# DB_ENGINE=sqlite runs against a local SQLite file, e.g. for the test suite
+if environ.get('DB_ENGINE') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+    }
+    # A second file (e.g. a copy of the first) to try replica routing locally
+    if environ.get('SQLITE_REPLICA_PATH'):
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': environ.get('SQLITE_REPLICA_PATH'),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# Migrations are generated at deploy time and not committed, so the test
+# database is created straight from the models
+DATABASES['default']['TEST'] = {'MIGRATE': False}
+
+# Optional read replica. Safe reads are routed to it by flashcards.db_router,
+# writes and reads shortly after a write go to the primary.
+if environ.get('POSTGRES_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': environ.get('POSTGRES_REPLICA_HOST'),
+        'PORT': environ.get('POSTGRES_REPLICA_PORT', environ.get('POSTGRES_PORT')),
+        # Seconds; an unreachable replica must not hold a request for the OS TCP timeout
+        'OPTIONS': {'connect_timeout': int(environ.get('POSTGRES_REPLICA_CONNECT_TIMEOUT', 2))},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['flashcards.db_router.PrimaryReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = int(environ.get('DATABASE_REPLICA_PIN_SECONDS', 5))
+DATABASE_REPLICA_RETRY_SECONDS = int(environ.get('DATABASE_REPLICA_RETRY_SECONDS', 30))
+
+# Cache shared by every gunicorn worker, import worker and management command.
+# The suggestion index and mix pool versions (cards/suggest.py, cards/mix.py)
+# live here, so a card written in one process invalidates the others. Without
+# REDIS_URL each process has its own local-memory cache, which is only right
+# for a single process (runserver, tests).
+if environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': environ.get('REDIS_URL'),
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -126,6 +178,11 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'static'
+STATICFILES_DIRS = [
+    BASE_DIR / 'assets',
+]
+# Hashed file names plus .gz/.br siblings, served by nginx with long-lived caching
+STATICFILES_STORAGE = 'flashcards.storage.CompressedManifestStaticFilesStorage'
 
 # Media files (User uploads)
 MEDIA_URL = '/media/'
@@ -143,6 +200,8 @@ STORAGE_EXTERNAL_ENDPOINT = environ.get('STORAGE_EXTERNAL_ENDPOINT')
 
 # Configure S3-compatible storage (works with both AWS S3 and MinIO)
 if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY and AWS_STORAGE_BUCKET_NAME:
+    # Given as dotted paths so boto3 is only imported when the storage is first used
+    INSTALLED_APPS.append('storages')
     DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
     
     # Common S3 settings
@@ -181,10 +240,38 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'cards.renderers.MessagePackRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+# Type-ahead suggestions (cards/suggest.py)
+# Prefix indexes are held in each worker's memory; these bound how much.
+CARDS_SUGGEST_MAX_GROUPS = int(environ.get('CARDS_SUGGEST_MAX_GROUPS', 64))
+CARDS_SUGGEST_MAX_NAMES = int(environ.get('CARDS_SUGGEST_MAX_NAMES', 50000))
+CARDS_SUGGEST_TTL = int(environ.get('CARDS_SUGGEST_TTL', 300))
+
+# Weighted multi-group study mixes (cards/mix.py)
+# Each pool takes 16 bytes per card id, so at most 32 x 100000 x 16 B = 51 MB per worker.
+CARDS_MIX_MAX_GROUPS = int(environ.get('CARDS_MIX_MAX_GROUPS', 32))
+CARDS_MIX_MAX_POOL = int(environ.get('CARDS_MIX_MAX_POOL', 100000))
+CARDS_MIX_TTL = int(environ.get('CARDS_MIX_TTL', 300))
+
+# Review event ingestion (cards/reviews.py)
+# Events are written in batches of this size, or after this many seconds.
+CARDS_REVIEW_BUFFER_SIZE = int(environ.get('CARDS_REVIEW_BUFFER_SIZE', 500))
+CARDS_REVIEW_FLUSH_INTERVAL = float(environ.get('CARDS_REVIEW_FLUSH_INTERVAL', 5))
+# rollup_reviews leaves events written in the last this many seconds for the next run.
+CARDS_REVIEW_ROLLUP_DELAY = int(environ.get('CARDS_REVIEW_ROLLUP_DELAY', 60))
+
+# Cold storage (cards/archive.py)
+# archive_cards moves cards archived for longer than this out of the card table.
+CARDS_ARCHIVE_AFTER_DAYS = int(environ.get('CARDS_ARCHIVE_AFTER_DAYS', 90))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -0,0 +1,63 @@
+"""
+Static files storage that fingerprints and precompresses assets.
+
+``collectstatic`` writes hashed copies of every asset (``style.3f2a...css``)
+plus a manifest that ``{% static %}`` uses to resolve them, then stores
+``.gz`` and, when the ``brotli`` package is installed, ``.br`` siblings next to
+each text asset so nginx can serve them with ``gzip_static``/``brotli_static``
+without compressing on every request.
+"""
+
+import gzip
+from os.path import splitext
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.svg', '.txt', '.html', '.json', '.xml', '.ico',
+}
+
+# Tiny files gain nothing from compression
+MIN_COMPRESS_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        processed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception) and hashed_name:
+                processed_names.update((name, hashed_name))
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+
+        for name in sorted(processed_names):
+            self.compress(name)
+
+    def compress(self, name):
+        if splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        with self.open(name) as original:
+            content = original.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+
+        variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        # Imported here: this storage also resolves {% static %} URLs in every
+        # web worker, which never compress anything
+        try:
+            import brotli
+        except ImportError:
+            pass
+        else:
+            variants.append(('.br', brotli.compress(content, quality=11)))
+
+        for suffix, compressed in variants:
+            if len(compressed) >= len(content):
+                continue
+            compressed_name = name + suffix
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
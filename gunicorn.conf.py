@@ -0,0 +1,51 @@
+"""
+Gunicorn configuration.
+
+With ``preload_app`` the Django application is imported once in the master
+and workers are forked from it, so the interpreter, Django, DRF and the
+modules in PRELOAD_MODULES are shared copy-on-write instead of being
+imported again by every worker. Set GUNICORN_PRELOAD=false to load the app
+in each worker instead (e.g. for code reloading).
+"""
+
+import gc
+import importlib
+from os import environ
+
+workers = int(environ.get('GUNICORN_WORKERS', 1))
+preload_app = environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Imported in the master before forking, only when they are installed and
+# the app is preloaded. Nothing here may open connections or start threads.
+# The S3 backend (and boto3) is added only when S3 storage is configured.
+PRELOAD_MODULES = [
+    'PIL.Image',
+    'msgpack',
+    'rest_framework.renderers',
+    'rest_framework.serializers',
+]
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+
+    from django.conf import settings
+    modules = list(PRELOAD_MODULES)
+    if 'storages' in settings.INSTALLED_APPS:
+        modules.insert(0, 'storages.backends.s3boto3')
+
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+    # Connections opened while loading the app must not be shared by workers
+    from django.db import connections
+    connections.close_all()
+
+    # Move everything allocated so far out of the collector's reach, so GC
+    # passes in workers do not write to (and un-share) the inherited pages
+    gc.collect()
+    gc.freeze()
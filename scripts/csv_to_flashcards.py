@@ -21,6 +21,8 @@ import argparse
 import sys
 import os
 import time
+import hashlib
+import tempfile
 from typing import Optional, Dict, Any
 import json
 
@@ -37,10 +39,106 @@ try:
 except ImportError:
     REPLICATE_AVAILABLE = False
 
+OPENAI_IMAGE_MODEL = "dall-e-3"
+REPLICATE_IMAGE_MODEL = "stability-ai/stable-diffusion:27b93a2413e7f36cd83da926f3656280b2931564ff050bf9575f1fdf9bcd7478"
+DEFAULT_IMAGE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "flashcards", "images")
+
+
+class ImageCache:
+    """
+    On-disk, content-addressed cache of generated images.
+
+    Images are stored under a hash of the provider/model and the normalized
+    image description, so re-imports and imports into other groups reuse
+    images instead of paying for generation and download again. The least
+    recently used files are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_IMAGE_CACHE_DIR, max_bytes: int = 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # key -> (last access time, size); file mtimes double as access times
+        self._entries = {}
+        for filename in os.listdir(cache_dir):
+            if filename.endswith('.img'):
+                stat = os.stat(os.path.join(cache_dir, filename))
+                self._entries[filename[:-4]] = (stat.st_mtime, stat.st_size)
+        self._size = sum(size for _, size in self._entries.values())
+
+    @staticmethod
+    def make_key(provider: str, description: str) -> str:
+        normalized = ' '.join(description.casefold().split())
+        return hashlib.sha256(f"{provider}\0{normalized}".encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.img")
+
+    def get(self, key: str) -> Optional[bytes]:
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self._forget(key)
+            self.misses += 1
+            return None
+        self._entries[key] = (time.time(), len(data))
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        self._forget(key)
+        self._entries[key] = (time.time(), len(data))
+        self._size += len(data)
+        self._evict()
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._size -= entry[1]
+
+    def _evict(self):
+        if self._size <= self.max_bytes:
+            return
+        for key in sorted(self._entries, key=lambda k: self._entries[k][0]):
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self._forget(key)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._size,
+        }
+
 
 class FlashCardUploader:
     def __init__(self, base_url: str = "http://5.161.100.20:8009", openai_api_key: str = None, 
-                 replicate_api_token: str = None):
+                 replicate_api_token: str = None, skip_duplicates: bool = False,
+                 image_cache: Optional[ImageCache] = None):
         """
         Initialize the FlashCard uploader.
         
@@ -48,10 +146,14 @@ class FlashCardUploader:
             base_url: Base URL of the FlashCards application
             openai_api_key: OpenAI API key for DALL-E image generation
             replicate_api_token: Replicate API token for Stable Diffusion
+            skip_duplicates: Ask the server to reject cards that already exist in the group
+            image_cache: Cache consulted before generating or downloading images
         """
         self.base_url = base_url.rstrip('/')
         self.api_base = f"{self.base_url}/api"
         self.session = requests.Session()
+        self.skip_duplicates = skip_duplicates
+        self.image_cache = image_cache
         
         # Initialize AI services
         self.openai_client = None
@@ -73,34 +175,44 @@ class FlashCardUploader:
             Group ID if successful, None otherwise
         """
         try:
-            # First, try to get existing groups
-            response = self.session.get(f"{self.api_base}/groups/")
-            if response.status_code == 200:
-                groups = response.json().get('results', [])
-                for group in groups:
-                    if group['name'].lower() == group_name.lower():
-                        print(f"✓ Found existing group: {group['name']} (ID: {group['id']})")
-                        return group['id']
-            
-            # If group doesn't exist, create it
-            group_data = {
-                "name": group_name,
-                "image": None
-            }
-            
-            response = self.session.post(f"{self.api_base}/groups/", json=group_data)
-            if response.status_code == 201:
+            response = self.session.post(f"{self.api_base}/groups/get_or_create/", json={"name": group_name})
+            if response.status_code in (200, 201):
                 group = response.json()
-                print(f"✓ Created new group: {group['name']} (ID: {group['id']})")
+                action = "Created new" if response.status_code == 201 else "Found existing"
+                print(f"✓ {action} group: {group['name']} (ID: {group['id']})")
                 return group['id']
             else:
-                print(f"✗ Failed to create group: {response.status_code} - {response.text}")
+                print(f"✗ Failed to get or create group: {response.status_code} - {response.text}")
                 return None
                 
         except Exception as e:
             print(f"✗ Error managing group: {e}")
             return None
     
+    def find_duplicate(self, name: str, group_id: int) -> Optional[str]:
+        """
+        Look up a card in the group whose normalized name matches.
+        
+        Args:
+            name: Card name
+            group_id: ID of the card group
+            
+        Returns:
+            UUID of the existing card, or None if there is none (or the check failed)
+        """
+        try:
+            response = self.session.get(
+                f"{self.api_base}/cards/",
+                params={"group": group_id, "duplicates_of": name, "fields": "uuid"},
+            )
+            if response.status_code == 200:
+                results = response.json().get("results", [])
+                return results[0]["uuid"] if results else None
+            print(f"    ⚠ Duplicate check failed: {response.status_code} (continuing)")
+        except Exception as e:
+            print(f"    ⚠ Duplicate check failed: {e} (continuing)")
+        return None
+    
     def generate_image_openai(self, description: str, word: str) -> Optional[str]:
         """
         Generate image using OpenAI DALL-E.
@@ -119,7 +231,7 @@ class FlashCardUploader:
             prompt = f"A clear, simple illustration of {description}. Educational style, clean background, suitable for language learning flashcard."
             
             response = self.openai_client.images.generate(
-                model="dall-e-3",
+                model=OPENAI_IMAGE_MODEL,
                 prompt=prompt,
                 size="1024x1024",
                 quality="standard",
@@ -150,7 +262,7 @@ class FlashCardUploader:
             prompt = f"A clear, simple illustration of {description}, educational style, clean background, high quality"
             
             output = replicate.run(
-                "stability-ai/stable-diffusion:27b93a2413e7f36cd83da926f3656280b2931564ff050bf9575f1fdf9bcd7478",
+                REPLICATE_IMAGE_MODEL,
                 input={
                     "prompt": prompt,
                     "width": 512,
@@ -203,6 +315,14 @@ class FlashCardUploader:
             True if successful, False otherwise
         """
         try:
+            # Check before generating an image, which is the slow and paid part.
+            # The server still rejects duplicates created in the meantime.
+            if self.skip_duplicates:
+                existing = self.find_duplicate(name, group_id)
+                if existing:
+                    print(f"  ⚠ Skipping '{name}': already in the group ({existing})")
+                    return False
+            
             card_data = {
                 "name": name,
                 "group": group_id,
@@ -212,35 +332,54 @@ class FlashCardUploader:
             
             # Try to generate image if requested and description provided
             image_url = None
+            image_data = None
             if generate_image and image_description:
-                print(f"  → Generating image for '{name}'...")
-                
                 # Try OpenAI first, then Replicate
+                provider = None
                 if self.openai_client:
-                    image_url = self.generate_image_openai(image_description, name)
+                    provider = f"openai:{OPENAI_IMAGE_MODEL}"
                 elif REPLICATE_AVAILABLE and self.replicate_token:
-                    image_url = self.generate_image_replicate(image_description, name)
-                
+                    provider = f"replicate:{REPLICATE_IMAGE_MODEL}"
+
+                cache_key = None
+                if provider and self.image_cache:
+                    cache_key = ImageCache.make_key(provider, image_description)
+                    image_data = self.image_cache.get(cache_key)
+                    if image_data:
+                        print(f"    ✓ Image loaded from cache ({len(image_data)} bytes)")
+
+                if not image_data:
+                    print(f"  → Generating image for '{name}'...")
+                    if self.openai_client:
+                        image_url = self.generate_image_openai(image_description, name)
+                    elif REPLICATE_AVAILABLE and self.replicate_token:
+                        image_url = self.generate_image_replicate(image_description, name)
+                    
+                    if image_url:
+                        print(f"    ✓ Image generated: {image_url[:50]}...")
+                    else:
+                        print(f"    ⚠ No image generated (continuing without image)")
+            
+                # If we have an image URL, download it and prepare for upload
                 if image_url:
-                    print(f"    ✓ Image generated: {image_url[:50]}...")
-                else:
-                    print(f"    ⚠ No image generated (continuing without image)")
+                    image_data = self.download_image(image_url)
+                    if image_data:
+                        print(f"    ✓ Image downloaded ({len(image_data)} bytes)")
+                        if cache_key:
+                            self.image_cache.put(cache_key, image_data)
             
-            # If we have an image URL, download it and prepare for upload
             files = {}
-            if image_url:
-                image_data = self.download_image(image_url)
-                if image_data:
-                    files['image'] = ('image.jpg', image_data, 'image/jpeg')
-                    print(f"    ✓ Image downloaded ({len(image_data)} bytes)")
+            if image_data:
+                files['image'] = ('image.jpg', image_data, 'image/jpeg')
             
             # Create the card
+            params = {"reject_duplicates": "true"} if self.skip_duplicates else None
             if files:
                 # Use multipart form data when uploading image
-                response = self.session.post(f"{self.api_base}/cards/", data=card_data, files=files)
+                response = self.session.post(f"{self.api_base}/cards/", data=card_data, files=files, params=params)
             else:
                 # Use JSON when no image
-                response = self.session.post(f"{self.api_base}/cards/", json=card_data)
+                response = self.session.post(f"{self.api_base}/cards/", json=card_data, params=params)
             
             if response.status_code == 201:
                 card = response.json()
@@ -341,6 +480,50 @@ class FlashCardUploader:
             
         return {"success": success_count, "failed": failed_count}
 
+    def submit_import(self, csv_file: str, group_name: str, poll_interval: float = 2.0) -> Dict[str, int]:
+        """
+        Upload the CSV as a background import job and wait for the server to finish it.
+        
+        Args:
+            csv_file: Path to the CSV file
+            group_name: Name of the card group
+            poll_interval: Seconds between progress checks
+            
+        Returns:
+            Dictionary with success and failure counts
+        """
+        try:
+            with open(csv_file, 'rb') as file:
+                response = self.session.post(
+                    f"{self.api_base}/imports/",
+                    data={"group_name": group_name, "skip_duplicates": self.skip_duplicates},
+                    files={"file": (os.path.basename(csv_file), file, 'text/csv')}
+                )
+            if response.status_code != 201:
+                print(f"✗ Failed to submit import: {response.status_code} - {response.text}")
+                return {"success": 0, "failed": 0}
+            
+            job = response.json()
+            print(f"✓ Submitted import job {job['id']}, waiting for a worker...")
+            while job['status'] in ('queued', 'running'):
+                time.sleep(poll_interval)
+                job = self.session.get(f"{self.api_base}/imports/{job['id']}/").json()
+                if job['status'] == 'running':
+                    print(f"  → {job['processed_rows']} rows processed "
+                          f"({job['created_cards']} created, {job['rows_per_second']} rows/s)")
+            
+            for error in job['errors']:
+                print(f"  ⚠ Row {error['row']}: {error['error']}")
+            if job['skipped_rows']:
+                print(f"  ⚠ Skipped {job['skipped_rows']} duplicate rows")
+            if job['status'] == 'failed':
+                print(f"✗ Import failed: {job['message']}")
+            return {"success": job['created_cards'], "failed": job['failed_rows']}
+            
+        except Exception as e:
+            print(f"✗ Error running background import: {e}")
+            return {"success": 0, "failed": 0}
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -363,6 +546,9 @@ Examples:
   # Without image generation
   python csv_to_flashcards.py words.csv --no-images
 
+  # Let the server import the file in the background
+  python csv_to_flashcards.py words.csv --background
+
 CSV Format:
   The CSV should have columns for the word/term, translation/description, and optionally image description.
   Common column names are automatically detected (German Word, English Translation, Description for Image).
@@ -378,6 +564,16 @@ CSV Format:
     parser.add_argument('--replicate-token', help='Replicate API token for Stable Diffusion')
     parser.add_argument('--no-images', action='store_true',
                        help='Skip image generation')
+    parser.add_argument('--skip-duplicates', action='store_true',
+                       help='Skip cards whose name already exists in the group (ignoring case, articles, umlaut spelling)')
+    parser.add_argument('--image-cache-dir', default=DEFAULT_IMAGE_CACHE_DIR,
+                       help=f'Directory for cached generated images (default: {DEFAULT_IMAGE_CACHE_DIR})')
+    parser.add_argument('--image-cache-size', type=int, default=1024,
+                       help='Maximum image cache size in MB (default: 1024)')
+    parser.add_argument('--no-image-cache', action='store_true',
+                       help='Always generate and download images, bypassing the cache')
+    parser.add_argument('--background', action='store_true',
+                       help='Upload the CSV as a server-side import job and wait for it (no image generation)')
     parser.add_argument('--delay', type=float, default=1.0,
                        help='Delay between API calls in seconds (default: 1.0)')
     
@@ -394,7 +590,7 @@ CSV Format:
         group_name = os.path.splitext(os.path.basename(args.csv_file))[0].replace('_', ' ').title()
     
     # Check for AI service availability
-    generate_images = not args.no_images
+    generate_images = not args.no_images and not args.background
     if generate_images:
         if args.openai_key and not OPENAI_AVAILABLE:
             print("Warning: OpenAI API key provided but openai library not installed")
@@ -409,11 +605,17 @@ CSV Format:
             print("  - For Replicate: --replicate-token YOUR_TOKEN")
             generate_images = False
     
+    image_cache = None
+    if generate_images and not args.no_image_cache:
+        image_cache = ImageCache(args.image_cache_dir, args.image_cache_size * 1024 * 1024)
+
     # Initialize uploader
     uploader = FlashCardUploader(
         base_url=args.base_url,
         openai_api_key=args.openai_key,
-        replicate_api_token=args.replicate_token
+        replicate_api_token=args.replicate_token,
+        skip_duplicates=args.skip_duplicates,
+        image_cache=image_cache
     )
     
     print(f"🚀 Starting FlashCard import")
@@ -425,12 +627,19 @@ CSV Format:
     print("-" * 50)
     
     # Process the CSV
-    results = uploader.process_csv(args.csv_file, group_name, generate_images, args.delay)
+    if args.background:
+        results = uploader.submit_import(args.csv_file, group_name)
+    else:
+        results = uploader.process_csv(args.csv_file, group_name, generate_images, args.delay)
     
     print("-" * 50)
     print(f"📊 Import completed!")
     print(f"   ✓ Success: {results['success']} cards")
     print(f"   ✗ Failed: {results['failed']} cards")
+    if image_cache:
+        stats = image_cache.stats()
+        print(f"   🖼  Image cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['evictions']} evicted, {stats['entries']} images ({stats['bytes'] // 1024} KB)")
     
     if results['success'] > 0:
         print(f"\n🎉 Cards are now available at: {args.base_url}")